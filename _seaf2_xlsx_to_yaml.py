@@ -1,14 +1,22 @@
+import os
 import sys
 import re
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Set
-from copy import deepcopy
-import math
+from typing import List, Dict, Any, Set
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import yaml
 import pandas as pd
 
-DEBUG_LOG_FILE = Path('debug_script.log')
+_NL_RE = re.compile(r'[\r\n]+')
+_NULL_TOKENS = frozenset({"nan", "none", "null", "n/a", "na", ""})
+_LIST_DASH_RE = re.compile(r'^\s*-', re.M)
+_MULTI_SPLIT_RE = re.compile(r'[\n;,]')
+_LOC_SPLIT_RE = re.compile(r'[;,\s]+')
+_TOKEN_RE = re.compile(r'[^A-Za-z0-9]+')
+_DC_RE = re.compile(r'\.dc(\d+)')
+_OFFICE_RE = re.compile(r'\.office\.([a-zA-Z0-9-]+)')
 
 # --- Schema Definitions for SEAF2 ---
 SCHEMA_DEF = {
@@ -56,12 +64,6 @@ SHEET_ALIASES = {
     '??????? ??????????': 'Сетевые устройства'
 }
 
-def log_debug(message):
-    try:
-        with DEBUG_LOG_FILE.open('a', encoding='utf-8') as f:
-            f.write(f"{message}\n")
-    except Exception: pass
-
 SPECIAL_ENTITY_MAP = {
     'Мониторинг': 'monitorings',
     'Логгирование': 'monitorings',
@@ -83,18 +85,22 @@ SVC_TYPE_MAP = {
     'Логгирование': 'Серверы приложений и т.д.'
 }
 
+_SVC_TRANS = str.maketrans('CAEOPXy', 'САЕОРХу')
+_ALLOWED_SVC = ["Управление ИТ-службой, ИТ-инфраструктурой и ИТ-активами (CMDB, ITSM и т.д.)", "Управление и автоматизацией (Ansible, Terraform, Jenkins и т.д.)", "Управление разработкой и хранения кода (Gitlab, Jira и т.д.)", "Управление сетевым адресным пространством (DHCP, DNS и т.д.)", "Виртуализация рабочих мест (ВАРМ и VDI)", "Шлюз, Балансировщик, прокси", "СУБД", "Распределенный кэш", "Интеграционная шина  (MQ, ETL, API)", "Файловый ресурс (FTP, NFS, SMB, S3 и т.д.)", "Инфраструктура удаленного доступа", "Коммуникации (АТС, Почта, мессенджеры, СМС шлюзы и т.д.)", "Серверы приложений и т.д."]
+_ALLOWED_SVC_NORM = {s.translate(_SVC_TRANS).strip(): s for s in _ALLOWED_SVC}
+
 # --- Validation Logic ---
 
 def normalize_sheet_name(name: str) -> str:
     return SHEET_ALIASES.get(name, name)
 
-def validate_structure(xlsx_path: Path, force: bool) -> bool:
+def validate_structure(xlsx_path: Path, force: bool, xls: 'ExcelBook | None' = None) -> 'ExcelBook | None':
     print(f"\n[CHECK] Analyzing structure: {xlsx_path.name}")
     try:
-        xls = pd.ExcelFile(xlsx_path)
+        if xls is None: xls = read_excel(xlsx_path)
     except Exception as e:
         print(f"[FATAL] Cannot open file: {e}")
-        return False
+        return None
 
     issues_found = False
     critical_missing = False
@@ -103,7 +109,7 @@ def validate_structure(xlsx_path: Path, force: bool) -> bool:
     
     if not found_sheets.intersection(relevant_sheets):
         print(f"  [!!] No recognized SEAF2 sheets found. (Expected one of: {', '.join(relevant_sheets)})")
-        return False if not force else True
+        return xls if force else None
 
     for sheet_orig in xls.sheet_names:
         sheet_norm = normalize_sheet_name(sheet_orig)
@@ -132,13 +138,13 @@ def validate_structure(xlsx_path: Path, force: bool) -> bool:
 
     if critical_missing and not force:
         print("\n[STOP] Critical columns are missing. Unable to proceed reliably.")
-        return False
+        return None
         
     if issues_found and not force:
         choice = input("\n[?] Structural issues found. Continue anyway? [y/N]: ").strip().lower()
-        if choice != 'y': return False
+        if choice != 'y': return None
             
-    return True
+    return xls
 
 class DataValidator:
     def __init__(self):
@@ -173,20 +179,14 @@ VALIDATOR = DataValidator()
 
 def normalize_svc_type(val):
     if not val: return 'Серверы приложений и т.д.'
-    trans = str.maketrans('CAEOPXy', 'САЕОРХу')
-    def norm(s): return str(s).translate(trans).strip()
-    val_norm = norm(val)
-    allowed = ["Управление ИТ-службой, ИТ-инфраструктурой и ИТ-активами (CMDB, ITSM и т.д.)", "Управление и автоматизацией (Ansible, Terraform, Jenkins и т.д.)", "Управление разработкой и хранения кода (Gitlab, Jira и т.д.)", "Управление сетевым адресным пространством (DHCP, DNS и т.д.)", "Виртуализация рабочих мест (ВАРМ и VDI)", "Шлюз, Балансировщик, прокси", "СУБД", "Распределенный кэш", "Интеграционная шина  (MQ, ETL, API)", "Файловый ресурс (FTP, NFS, SMB, S3 и т.д.)", "Инфраструктура удаленного доступа", "Коммуникации (АТС, Почта, мессенджеры, СМС шлюзы и т.д.)", "Серверы приложений и т.д."]
-    for item in allowed:
-        if norm(item) == val_norm: return item
-    return SVC_TYPE_MAP.get(val, 'Серверы приложений и т.д.')
+    return _ALLOWED_SVC_NORM.get(str(val).translate(_SVC_TRANS).strip()) or SVC_TYPE_MAP.get(val, 'Серверы приложений и т.д.')
 
 def derive_location_from_network(net_id):
     if not net_id: return None
     prefix = net_id.split('.')[0] if '.' in net_id else 'seaf'
-    m_dc = re.search(r'\.dc(\d+)', net_id)
+    m_dc = _DC_RE.search(net_id)
     if m_dc: return f"{prefix}.dc.{m_dc.group(1)}"
-    m_off = re.search(r'\.office\.([a-zA-Z0-9-]+)', net_id)
+    m_off = _OFFICE_RE.search(net_id)
     if m_off:
         parts = net_id.split('.')
         try:
@@ -202,240 +202,291 @@ def ensure_deps():
         import subprocess
         subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pandas', 'openpyxl', 'pyyaml'])
 
-def read_excel(path: Path):
+try:
+    import python_calamine
+    EXCEL_ENGINE = 'calamine'
+except ImportError: EXCEL_ENGINE = 'openpyxl'
+
+class ExcelBook:
+    def __init__(self, path: Path, frames: Dict[str, pd.DataFrame] | None = None):
+        self.path = path
+        self.xls = None if frames is not None else pd.ExcelFile(path, engine=EXCEL_ENGINE)
+        self.sheet_names = list(frames) if frames is not None else self.xls.sheet_names
+        self._frames: Dict[str, pd.DataFrame] = frames or {}
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self._frames: self._frames[sheet_name] = self.xls.parse(sheet_name)
+        return self._frames[sheet_name]
+
+def read_excel(path: Path) -> ExcelBook:
     if not path.exists(): raise FileNotFoundError(f"Excel file not found: {path}")
-    try: return pd.ExcelFile(path)
+    try: return ExcelBook(path)
     except Exception as e: raise RuntimeError(f"Failed to open Excel {path.name}: {e}")
 
-def non_empty_rows(df): return df.dropna(how='all')
+def _load_sheets(path: Path) -> Dict[str, pd.DataFrame]:
+    return pd.read_excel(path, sheet_name=None, engine=EXCEL_ENGINE)
+
+def load_workbooks(paths: List[Path]) -> Dict[Path, ExcelBook]:
+    if len(paths) < 2: return {}
+    try:
+        with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as ex:
+            futures = {p: ex.submit(_load_sheets, p) for p in paths}
+            books = {}
+            for p, fut in futures.items():
+                try: books[p] = ExcelBook(p, fut.result())
+                except Exception: pass
+            return books
+    except Exception as e:
+        print(f"WARN: Parallel workbook loading failed, falling back to sequential: {e}", file=sys.stderr)
+        return {}
+
+def non_empty_rows(df):
+    mask = df.notna().to_numpy().any(axis=1)
+    return df if mask.all() else df.iloc[mask]
+
+def get_col(df, *names):
+    for name in names:
+        if name in df.columns: return df[name].to_numpy()
+    return [None] * len(df)
+
+def clean_col(df, *names) -> List[Any]: return [ws_clean(v) for v in get_col(df, *names)]
+
+def id_col(df, *names) -> List[str | None]: return [id_clean(v) for v in get_col(df, *names)]
+
+def ids_col(df, *names) -> List[List[str]]: return [parse_multiline_ids(v) for v in get_col(df, *names)]
+
+def locs_col(df, *names) -> List[List[str]]: return [parse_locations(v) for v in get_col(df, *names)]
 
 def ws_clean(s: Any) -> Any:
-    if s is None: return None
-    if isinstance(s, float) and math.isnan(s): return None
-    s = str(s)
-    if not s: return None
-    s = s.replace('\u00A0', ' ').replace('\xa0', ' ').replace('\t', ' ').replace('\n', ' ').replace('\r', ' ')
-    s = re.sub(r'\s+', ' ', s).strip()
-    if s.lower() in {"nan", "none", "null", "n/a", "na", ""}: return None
+    if s is None or (isinstance(s, float) and s != s): return None
+    s = ' '.join(str(s).split())
+    if s.lower() in _NULL_TOKENS: return None
     return s or None
 
 def id_clean(s: Any) -> str | None:
-    s = ws_clean(s)
-    return re.sub(r'\s+', '', s) if s else None
+    if s is None or (isinstance(s, float) and s != s): return None
+    s = ''.join(str(s).split())
+    return None if s.lower() in _NULL_TOKENS else s
 
 def parse_multiline_ids(val) -> List[str]:
     if val is None: return []
     if isinstance(val, list): return [t for x in val if (t := id_clean(x))]
-    text = str(val).replace('\r', '\n')
-    tokens = []
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line: continue
-        if line.startswith('-'): line = line[1:].strip()
-        for piece in re.split(r'[;,]', line):
-            if cleaned := id_clean(piece): tokens.append(cleaned)
-    return tokens
+    text = _LIST_DASH_RE.sub('', str(val).replace('\r', '\n'))
+    return [t for piece in _MULTI_SPLIT_RE.split(text) if (t := id_clean(piece))]
 
 def parse_locations(val: Any) -> List[str]:
     if val is None: return []
     s = ws_clean(str(val))
-    return [t for p in re.split(r'[;,\s]+', s) if (t := id_clean(p))] if s else []
+    return [t for p in _LOC_SPLIT_RE.split(s) if (t := id_clean(p))] if s else []
 
+# Stays on the pure-Python SafeDumper: libyaml's emitter ignores the increase_indent override
 class IndentedDumper(yaml.SafeDumper):
     def increase_indent(self, flow=False, indentless=False): return super(IndentedDumper, self).increase_indent(flow, False)
 
+def _represent_clean_str(dumper, data): return dumper.represent_str(_NL_RE.sub(' ', data))
+IndentedDumper.add_representer(str, _represent_clean_str)
+
+_YAML_INDICATORS = frozenset('-?:,[]{}#&*!|>\'"%@`')
+_YAML_RESOLVER = yaml.resolver.Resolver()
+
+def _is_plain(s: str) -> bool:
+    return (bool(s) and s[0] not in _YAML_INDICATORS and s[-1] != ':' and s == s.strip() and s.isprintable() and ': ' not in s and ' #' not in s
+            and _YAML_RESOLVER.resolve(yaml.ScalarNode, s, (True, False)) == 'tag:yaml.org,2002:str')
+
+def _yaml_scalar(v: Any, is_key: bool = False) -> str:
+    if v is None: return 'null'
+    if v is True: return 'true'
+    if v is False: return 'false'
+    if isinstance(v, int) and not is_key: return str(v)
+    if not isinstance(v, str): raise ValueError(f"unsupported scalar {v!r}")
+    if not is_key: v = _NL_RE.sub(' ', v)
+    if _is_plain(v) and len(v) < 1024: out = v
+    elif v.isprintable(): out = "'" + v.replace("'", "''") + "'"
+    else: raise ValueError(f"unsupported scalar {v!r}")
+    # Implicit keys are limited to 1024 characters; longer ones need yaml.dump's explicit '? ' form
+    if is_key and len(out) >= 1024: raise ValueError(f"key too long for an implicit key ({len(out)} chars)")
+    return out
+
+def _iter_entity_yaml(data: Dict[str, Any]):
+    # Fixed SEAF shape: {root: {id: {field: scalar | [scalar] | {key: scalar}}}}
+    for root, entities in data.items():
+        if not isinstance(entities, dict): raise ValueError(f"unexpected shape under {root!r}")
+        yield f"{_yaml_scalar(root, True)}:{'' if entities else ' {}'}\n"
+        for eid, fields in entities.items():
+            if not isinstance(fields, dict): raise ValueError(f"unexpected shape under {eid!r}")
+            lines = [f"  {_yaml_scalar(eid, True)}:{'' if fields else ' {}'}"]
+            for k, v in fields.items():
+                key = _yaml_scalar(k, True)
+                if isinstance(v, list):
+                    if not v: lines.append(f"    {key}: []"); continue
+                    lines.append(f"    {key}:")
+                    lines.extend(f"      - {_yaml_scalar(i)}" for i in v)
+                elif isinstance(v, dict):
+                    items = [(_yaml_scalar(sk, True), _yaml_scalar(sv)) for sk, sv in v.items()]
+                    if not items: lines.append(f"    {key}: {{}}"); continue
+                    lines.append(f"    {key}:")
+                    lines.extend(f"      {sk}: {sv}" for sk, sv in items)
+                else: lines.append(f"    {key}: {_yaml_scalar(v)}")
+            yield '\n'.join(lines) + '\n'
+
+WRITTEN_COUNTS: Dict[Path, Dict[str, int]] = {}
+
 def write_yaml(path: Path, data: Dict[str, Any]):
     try:
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open('w', encoding='utf-8') as f:
-            yaml.dump(sanitize_for_yaml(data), f, Dumper=IndentedDumper, allow_unicode=True, sort_keys=False)
-    except Exception as e: print(f"ERROR: Failed to write YAML to {path}: {e}", file=sys.stderr)
-
-def sanitize_for_yaml(value: Any) -> Any:
-    if isinstance(value, dict): return {k: sanitize_for_yaml(v) for k, v in value.items() if not k.startswith('_')}
-    if isinstance(value, list): return [sanitize_for_yaml(v) for v in value]
-    if isinstance(value, str): return re.sub(r'[\r\n]+', ' ', value)
-    return value
-
-def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
-    counts = {}
-    sheet_map = {'Регионы': 'dc_regions', 'AZ': 'dc_azs', 'DC': 'dcs', 'Офисы': 'dc_offices', 'Сегменты': 'network_segments', 'Сети': 'networks', 'Сетевые устройства': 'components.networks', 'Сервисы КБ': 'kbs', 'Тех. сервисы': 'tech_services', 'Tech Services': 'tech_services'}
-    for file_path in xlsx_files:
-        if not file_path.exists(): continue
-        try:
-            xls = pd.ExcelFile(file_path)
-            for sheet_name in xls.sheet_names:
-                if sheet_name in sheet_map:
-                    df = non_empty_rows(xls.parse(sheet_name))
-                    ename = sheet_map[sheet_name]
-                    if ename == 'tech_services':
-                        for _, row in df.iterrows():
-                            svc_raw = ws_clean(row.get('Тип сервиса')) or ws_clean(row.get('Класс'))
-                            res_val = ws_clean(row.get('Тип резервирования'))
-                            etype = 'compute_services'
-                            if svc_raw in SPECIAL_ENTITY_MAP: etype = SPECIAL_ENTITY_MAP[svc_raw]
-                            elif svc_raw == 'Cluster' or (res_val and res_val.lower() in ['active-active', 'active-passive', 'n+1', 'да']): etype = 'clusters'
-                            counts[etype] = counts.get(etype, 0) + 1
-                    else: counts[ename] = counts.get(ename, 0) + len(df)
-        except Exception as e: print(f"WARN: Count failed for {file_path.name}: {e}", file=sys.stderr)
-    return counts
+            try: f.writelines(_iter_entity_yaml(data))
+            except ValueError:
+                f.seek(0); f.truncate()
+                yaml.dump(data, f, Dumper=IndentedDumper, allow_unicode=True, sort_keys=False)
+        WRITTEN_COUNTS[path] = {key.replace('seaf.company.ta.services.', '').replace('seaf.company.ta.components.', 'components.'): len(val) for key, val in data.items() if isinstance(val, dict)}
+    except Exception as e:
+        WRITTEN_COUNTS.pop(path, None)
+        print(f"ERROR: Failed to write YAML to {path}: {e}", file=sys.stderr)
 
-def count_entities_in_yaml_dir(yaml_dir: Path) -> Dict[str, int]:
+def count_written_entities() -> Dict[str, int]:
     counts = {}
-    if not yaml_dir.exists(): return counts
-    for p in sorted(yaml_dir.glob('**/*.yaml')):
-        try:
-            with p.open('r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-                if not isinstance(data, dict): continue
-                for key, val in data.items():
-                    if isinstance(val, dict):
-                        ename = key.replace('seaf.company.ta.services.', '').replace('seaf.company.ta.components.', 'components.')
-                        counts[ename] = counts.get(ename, 0) + len(val)
-        except Exception: continue
+    for file_counts in WRITTEN_COUNTS.values():
+        for ename, n in file_counts.items(): counts[ename] = counts.get(ename, 0) + n
     return counts
 
-def convert_regions_az_dc_offices(xlsx_path: Path, out_dir: Path):
-    try: xls = read_excel(xlsx_path)
-    except Exception as e: print(f"ERROR: {e}", file=sys.stderr); return
-    reg, azs, dcs, off, proc = {}, {}, {}, {}, set()
+def convert_regions_az_dc_offices(xls: ExcelBook, out_dir: Path) -> Dict[str, int]:
+    reg, azs, dcs, off, counts = {}, {}, {}, {}, {}
     if 'Регионы' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Регионы')).iterrows():
-            rid = id_clean(row.get('ID Региона'))
-            if rid and rid not in proc:
-                proc.add(rid)
-                reg[rid] = {'description': ws_clean(row.get('Описание')), 'external_id': rid.split('.')[-1], 'title': ws_clean(row.get('Наименование'))}
+        df = non_empty_rows(xls.parse('Регионы'))
+        counts['dc_regions'] = len(df)
+        for rid, desc, title in zip(id_col(df, 'ID Региона'), clean_col(df, 'Описание'), clean_col(df, 'Наименование')):
+            if rid and rid not in reg:
+                reg[rid] = {'description': desc, 'external_id': rid.rsplit('.', 1)[-1], 'title': title}
                 VALIDATOR.register_id(rid, "Регионы")
     if reg: write_yaml(out_dir / 'dc_region.yaml', {'seaf.company.ta.services.dc_regions': reg})
-    proc = set()
     if 'AZ' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('AZ')).iterrows():
-            aid = id_clean(row.get('ID AZ'))
-            if aid and aid not in proc:
-                proc.add(aid)
-                azs[aid] = {'description': ws_clean(row.get('Описание')), 'external_id': aid.split('.')[-1], 'region': id_clean(row.get('Регион')), 'title': ws_clean(row.get('Наименование')), 'vendor': ws_clean(row.get('Поставщик'))}
+        df = non_empty_rows(xls.parse('AZ'))
+        counts['dc_azs'] = len(df)
+        for aid, desc, region, title, vendor in zip(id_col(df, 'ID AZ'), clean_col(df, 'Описание'), id_col(df, 'Регион'), clean_col(df, 'Наименование'), clean_col(df, 'Поставщик')):
+            if aid and aid not in azs:
+                azs[aid] = {'description': desc, 'external_id': aid.rsplit('.', 1)[-1], 'region': region, 'title': title, 'vendor': vendor}
                 VALIDATOR.register_id(aid, "AZ")
     if azs: write_yaml(out_dir / 'dc_az.yaml', {'seaf.company.ta.services.dc_azs': azs})
-    proc = set()
     if 'DC' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('DC')).iterrows():
-            did = id_clean(row.get('ID DC'))
-            if did and did not in proc:
-                proc.add(did)
-                dcs[did] = {'address': ws_clean(row.get('Адрес')), 'availabilityzone': id_clean(row.get('AZ')), 'description': ws_clean(row.get('Описание')), 'external_id': did.split('.')[-1], 'ownership': ws_clean(row.get('Форма владения')), 'rack_qty': ws_clean(row.get('Кол-во стоек')), 'tier': ws_clean(row.get('Tier')), 'title': ws_clean(row.get('Наименование')), 'type': ws_clean(row.get('Тип')), 'vendor': ws_clean(row.get('Поставщик'))}
+        df = non_empty_rows(xls.parse('DC'))
+        counts['dcs'] = len(df)
+        cols = [id_col(df, 'ID DC'), clean_col(df, 'Адрес'), id_col(df, 'AZ')] + [clean_col(df, c) for c in ('Описание', 'Форма владения', 'Кол-во стоек', 'Tier', 'Наименование', 'Тип', 'Поставщик')]
+        for did, addr, az, desc, own, racks, tier, title, dtype, vendor in zip(*cols):
+            if did and did not in dcs:
+                dcs[did] = {'address': addr, 'availabilityzone': az, 'description': desc, 'external_id': did.rsplit('.', 1)[-1], 'ownership': own, 'rack_qty': racks, 'tier': tier, 'title': title, 'type': dtype, 'vendor': vendor}
                 VALIDATOR.register_id(did, "DC")
     if dcs: write_yaml(out_dir / 'dc.yaml', {'seaf.company.ta.services.dcs': dcs})
-    proc = set()
     if 'Офисы' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Офисы')).iterrows():
-            oid = id_clean(row.get('ID Офиса'))
-            if oid and oid not in proc:
-                proc.add(oid)
-                off[oid] = {'address': ws_clean(row.get('Адрес')), 'description': ws_clean(row.get('Описание')), 'external_id': oid.split('.')[-1], 'region': id_clean(row.get('Регион')), 'title': ws_clean(row.get('Наименование'))}
+        df = non_empty_rows(xls.parse('Офисы'))
+        counts['dc_offices'] = len(df)
+        for oid, addr, desc, region, title in zip(id_col(df, 'ID Офиса'), clean_col(df, 'Адрес'), clean_col(df, 'Описание'), id_col(df, 'Регион'), clean_col(df, 'Наименование')):
+            if oid and oid not in off:
+                off[oid] = {'address': addr, 'description': desc, 'external_id': oid.rsplit('.', 1)[-1], 'region': region, 'title': title}
                 VALIDATOR.register_id(oid, "Офисы")
     if off: write_yaml(out_dir / 'dc_office.yaml', {'seaf.company.ta.services.dc_offices': off})
+    return counts
 
-def convert_segments_nets_devices(xlsx_path: Path, out_dir: Path) -> int:
-    try: xls = read_excel(xlsx_path)
-    except Exception as e: print(f"ERROR: {e}", file=sys.stderr); return 0
-    segments, proc_seg = {}, set()
+def convert_segments_nets_devices(xls: ExcelBook, out_dir: Path) -> Dict[str, int]:
+    segments, counts = {}, {}
     if 'Сегменты' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Сегменты')).iterrows():
-            sid = id_clean(row.get('ID сетевые сегмента/зоны'))
-            if sid and sid not in proc_seg:
-                proc_seg.add(sid)
-                locs = parse_locations(row.get('Расположение'))
-                segments[sid] = {'title': ws_clean(row.get('Наименование')), 'description': ws_clean(row.get('Описание')), 'sber': {'location': locs[0] if locs else None, 'zone': ws_clean(row.get('Зона'))}}
+        df = non_empty_rows(xls.parse('Сегменты'))
+        counts['network_segments'] = len(df)
+        for sid, locs, title, desc, zone in zip(id_col(df, 'ID сетевые сегмента/зоны'), locs_col(df, 'Расположение'), clean_col(df, 'Наименование'), clean_col(df, 'Описание'), clean_col(df, 'Зона')):
+            if sid and sid not in segments:
+                segments[sid] = {'title': title, 'description': desc, 'sber': {'location': locs[0] if locs else None, 'zone': zone}}
                 VALIDATOR.register_id(sid, "Сегменты")
-    nets, proc_net = {}, set()
+    nets = {}
     if 'Сети' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Сети')).iterrows():
-            nid = id_clean(row.get('ID Network'))
-            if nid and nid not in proc_net:
-                proc_net.add(nid)
+        df = non_empty_rows(xls.parse('Сети'))
+        counts['networks'] = len(df)
+        cols = [id_col(df, 'ID Network')] + [clean_col(df, c) for c in ('Тип сети', 'Наименование', 'Описание')] + [locs_col(df, 'Расположение'), ids_col(df, 'Сетевой сегмент/зона(ID)', 'Сетевой сегмент/зона')]
+        cols += [clean_col(df, *c) for c in (('VLAN',), ('Адрес сети',), ('Тип сети (проводная, беспроводная)', 'Тип LAN'), ('WAN Адрес',), ('Провайдер',), ('VRF  ', 'VRF'))]
+        for nid, ntype, title, desc, locs, seg, vlan, ipnet, lan_type, wan_ip, prov, vrf in zip(*cols):
+            if nid and nid not in nets:
                 VALIDATOR.register_id(nid, "Сети")
                 VALIDATOR.register_network(nid)
-                ntype = ws_clean(row.get('Тип сети'))
-                entry = {'title': ws_clean(row.get('Наименование')), 'description': ws_clean(row.get('Описание')), 'type': ntype, 'location': parse_locations(row.get('Расположение')), 'segment': parse_multiline_ids(row.get('Сетевой сегмент/зона(ID)') or row.get('Сетевой сегмент/зона'))}
+                entry = {'title': title, 'description': desc, 'type': ntype, 'location': locs, 'segment': seg}
                 if ntype == 'LAN':
-                    if vlan := ws_clean(row.get('VLAN')):
+                    if vlan:
                         try: entry['vlan'] = int(float(vlan))
                         except ValueError: pass
-                    entry['ipnetwork'] = ws_clean(row.get('Адрес сети'))
-                    entry['lan_type'] = ws_clean(row.get('Тип сети (проводная, беспроводная)') or row.get('Тип LAN'))
-                elif ntype == 'WAN': entry['wan_ip'] = ws_clean(row.get('WAN Адрес'))
-                if prov := ws_clean(row.get('Провайдер')): entry['provider'] = prov
-                if vrf := ws_clean(row.get('VRF  ') or ws_clean(row.get('VRF'))): entry['VRF'] = vrf
+                    entry['ipnetwork'] = ipnet
+                    entry['lan_type'] = lan_type
+                elif ntype == 'WAN': entry['wan_ip'] = wan_ip
+                if prov: entry['provider'] = prov
+                if vrf: entry['VRF'] = vrf
                 nets[nid] = entry
     if segments: write_yaml(out_dir / 'network_segment.yaml', {'seaf.company.ta.services.network_segments': segments})
     if nets: 
         prefix = next(iter(nets.keys())).split('.')[0] if '.' in next(iter(nets.keys())) else ''
-        per_loc, misc = {}, {}
+        if prefix: dc_pat, off_pat = re.compile(rf'{re.escape(prefix)}\.dc\.(\d+)'), re.compile(rf'{re.escape(prefix)}\.office\.(.+)')
+        per_loc, misc = defaultdict(dict), {}
         for nid, entry in nets.items():
             locs = entry.get('location')
             if not locs: misc[nid] = entry; continue
             for loc in locs:
-                token = re.sub(r'[^A-Za-z0-9]+', '_', str(loc)).strip('_') or 'loc'
+                token = _TOKEN_RE.sub('_', str(loc)).strip('_') or 'loc'
                 if prefix:
-                    if m := re.search(rf'{re.escape(prefix)}\.dc\.(\d+)', loc): token = f'dc{m.group(1)}'
-                    elif m := re.search(rf'{re.escape(prefix)}\.office\.(.+)', loc): token = f'office_{m.group(1)}'
-                per_loc.setdefault(token, {})[nid] = entry
+                    if m := dc_pat.search(loc): token = f'dc{m.group(1)}'
+                    elif m := off_pat.search(loc): token = f'office_{m.group(1)}'
+                per_loc[token][nid] = entry
         for t, s in per_loc.items(): write_yaml(out_dir / f'networks_{t}.yaml', {'seaf.company.ta.services.networks': s})
         if misc: write_yaml(out_dir / 'networks_misc.yaml', {'seaf.company.ta.services.networks': misc})
     devs, proc_dev = {}, set()
     sheet = next((s for s in xls.sheet_names if s in ['Сетевые устройства', '??????? ??????????']), None)
     if sheet:
-        for idx, row in non_empty_rows(xls.parse(sheet)).iterrows():
-            did = id_clean(row.get('ID Устройства') or row.get('ID ??????????'))
+        df = non_empty_rows(xls.parse(sheet))
+        counts['components.networks'] = len(df)
+        cols = [id_col(df, 'ID Устройства', 'ID ??????????'), locs_col(df, 'Расположение'), ids_col(df, 'Подключенные сети (список)', 'Подключенные сети'), clean_col(df, 'Наименование'), clean_col(df, 'Тип реализации'), clean_col(df, 'Тип устройства', 'Тип'), id_col(df, 'Расположение (ID сегмента/зоны)', 'Сетевой сегмент/зона (ID)')]
+        cols += [clean_col(df, c) for c in ('Модель', 'Назначение', 'IP адрес', 'Описание')]
+        for did, locs, conn_nets, title, real_type, dtype, seg, *extra in zip(*cols):
             if did and did not in proc_dev:
                 proc_dev.add(did)
                 VALIDATOR.register_id(did, "Сетевые устройства")
-                locs = parse_locations(row.get('Расположение'))
-                conn_nets = parse_multiline_ids(row.get('Подключенные сети (список)') or row.get('Подключенные сети'))
                 VALIDATOR.check_ref_network(conn_nets, did)
-                obj = {'title': ws_clean(row.get('Наименование')) or did, 'realization_type': ws_clean(row.get('Тип реализации')), 'type': ws_clean(row.get('Тип устройства') or row.get('Тип')), 'network_connection': conn_nets, 'segment': id_clean(row.get('Расположение (ID сегмента/зоны)') or row.get('Сетевой сегмент/зона (ID)'))}
-                for k, cols in [('model', ['Модель']), ('purpose', ['Назначение']), ('address', ['IP адрес']), ('description', ['Описание'])]:
-                    for c in cols:
-                        if val := ws_clean(row.get(c)): obj[k] = val; break
+                obj = {'title': title or did, 'realization_type': real_type, 'type': dtype, 'network_connection': conn_nets, 'segment': seg}
+                for k, val in zip(('model', 'purpose', 'address', 'description'), extra):
+                    if val: obj[k] = val
                 if len(locs) > 1:
-                    for l in locs: devs[f"{did}-{l.split('.')[-1]}"] = {**obj, 'location': l}
+                    for l in locs: devs[f"{did}-{l.rsplit('.', 1)[-1]}"] = {**obj, 'location': l}
                 else: obj['location'] = locs[0] if locs else None; devs[did] = obj
     if devs: write_yaml(out_dir / 'network_component.yaml', {'seaf.company.ta.components.networks': devs})
-    return 0
+    return counts
 
-def convert_kb_services(xlsx_path: Path, out_dir: Path):
+def convert_kb_services(xls: ExcelBook, out_dir: Path) -> Dict[str, int]:
+    counts = {}
     try:
-        xls = read_excel(xlsx_path)
-        if 'Сервисы КБ' not in xls.sheet_names: return
-        kb, proc = {}, set()
-        for idx, row in non_empty_rows(xls.parse('Сервисы КБ')).iterrows():
-            sid = id_clean(row.get('ID КБ сервиса'))
-            if sid and sid not in proc:
-                proc.add(sid)
+        if 'Сервисы КБ' not in xls.sheet_names: return counts
+        kb = {}
+        df = non_empty_rows(xls.parse('Сервисы КБ'))
+        counts['kbs'] = len(df)
+        cols = [id_col(df, 'ID КБ сервиса'), ids_col(df, 'Подключенные сети')] + [clean_col(df, c) for c in ('Название сервиса', 'Название', 'Описание', 'Статус', 'Технология', 'Название ПО', 'Tag')]
+        for sid, conn_nets, title, title_alt, desc, status, tech, sw, tag in zip(*cols):
+            if sid and sid not in kb:
                 VALIDATOR.register_id(sid, "Сервисы КБ")
-                conn_nets = parse_multiline_ids(row.get('Подключенные сети'))
                 VALIDATOR.check_ref_network(conn_nets, sid)
-                kb[sid] = {'title': ws_clean(row.get('Название сервиса')) or ws_clean(row.get('Название')), 'description': ws_clean(row.get('Описание')), 'status': ws_clean(row.get('Статус')), 'technology': ws_clean(row.get('Технология')), 'software_name': ws_clean(row.get('Название ПО')), 'tag': ws_clean(row.get('Tag')), 'network_connection': conn_nets}
+                kb[sid] = {'title': title or title_alt, 'description': desc, 'status': status, 'technology': tech, 'software_name': sw, 'tag': tag, 'network_connection': conn_nets}
         if kb: write_yaml(out_dir / 'kb.yaml', {'seaf.company.ta.services.kbs': kb})
-    except Exception as e: print(f"WARN: KB failed for {xlsx_path.name}: {e}", file=sys.stderr)
+    except Exception as e: print(f"WARN: KB failed for {xls.path.name}: {e}", file=sys.stderr)
+    return counts
 
-def convert_tech_services(xlsx_path: Path, out_dir: Path):
+def convert_tech_services(xls: ExcelBook, out_dir: Path) -> Dict[str, int]:
+    counts = {}
     try:
-        xls = read_excel(xlsx_path)
         sheet = next((s for s in xls.sheet_names if s in ['Тех. сервисы', 'Tech Services']), None)
-        if not sheet: return
+        if not sheet: return counts
         out_data = {'compute_services': {}, 'clusters': {}, 'monitorings': {}, 'backups': {}}
-        proc = set()
         df = non_empty_rows(xls.parse(sheet))
-        for _, row in df.iterrows():
-            oid = id_clean(row.get('Идентификатор'))
+        cols = [id_col(df, 'Идентификатор')] + [clean_col(df, c) for c in ('Тип сервиса', 'Класс', 'Тип резервирования')] + [ids_col(df, 'Подключен к сети', 'Подключен к  сети'), locs_col(df, 'ЦОД')] + [clean_col(df, c) for c in ('Наименование', 'Описание')]
+        for oid, svc, cls_val, res_val, nets, locs, title, desc in zip(*cols):
+            svc_raw = svc or cls_val
+            etype = 'compute_services'
+            if svc_raw in SPECIAL_ENTITY_MAP: etype = SPECIAL_ENTITY_MAP[svc_raw]
+            elif cls_val == 'Cluster' or (res_val and res_val.lower() in ['active-active','active-passive','n+1','да']): etype = 'clusters'
+            counts[etype] = counts.get(etype, 0) + 1
             if not oid: continue
             
-            svc_raw = ws_clean(row.get('Тип сервиса')) or ws_clean(row.get('Класс'))
-            res_val = ws_clean(row.get('Тип резервирования'))
-            cls_val = ws_clean(row.get('Класс'))
-            nets = parse_multiline_ids(row.get('Подключен к сети') or row.get('Подключен к  сети'))
-            locs = parse_locations(row.get('ЦОД'))
             if not locs:
                 for n in nets:
                     if l := derive_location_from_network(n): locs.append(l)
@@ -443,11 +494,6 @@ def convert_tech_services(xlsx_path: Path, out_dir: Path):
             
             VALIDATOR.check_ref_network(nets, oid)
             
-            etype = 'compute_services'
-            if svc_raw in SPECIAL_ENTITY_MAP: etype = SPECIAL_ENTITY_MAP[svc_raw]
-            elif cls_val == 'Cluster' or (res_val and res_val.lower() in ['active-active','active-passive','n+1','да']): etype = 'clusters'
-            elif cls_val == 'Compute Service': etype = 'compute_services'
-            
             if oid in out_data[etype]:
                 existing = out_data[etype][oid]
                 existing['location'] = sorted(list(set(existing['location'] + locs)))
@@ -455,7 +501,7 @@ def convert_tech_services(xlsx_path: Path, out_dir: Path):
                 continue
             
             VALIDATOR.register_id(oid, "Тех. сервисы")
-            obj = {'title': ws_clean(row.get('Наименование')), 'description': ws_clean(row.get('Описание')), 'location': locs, 'network_connection': nets, 'availabilityzone': []}
+            obj = {'title': title, 'description': desc, 'location': locs, 'network_connection': nets, 'availabilityzone': []}
             if etype in ['compute_services', 'clusters']: obj['service_type'] = normalize_svc_type(svc_raw)
             if etype == 'clusters': obj['reservation_type'] = res_val
             elif etype == 'monitorings': obj.update({'role':['Monitoring'], 'ha': res_val is not None, 'monitored_services':[]})
@@ -464,19 +510,22 @@ def convert_tech_services(xlsx_path: Path, out_dir: Path):
         emap = {'compute_services': ('compute_service.yaml', 'seaf.company.ta.services.compute_services'), 'clusters': ('cluster.yaml', 'seaf.company.ta.services.clusters'), 'monitorings': ('monitoring.yaml', 'seaf.company.ta.services.monitorings'), 'backups': ('backup.yaml', 'seaf.company.ta.services.backups')}
         for k, (fn, root) in emap.items():
             if out_data[k]: write_yaml(out_dir / fn, {root: out_data[k]})
-    except Exception as e: print(f"ERROR: Tech failed for {xlsx_path.name}: {e}", file=sys.stderr)
+    except Exception as e: print(f"ERROR: Tech failed for {xls.path.name}: {e}", file=sys.stderr)
+    return counts
 
 def write_root(out_dir: Path):
     imports = [p.name for p in sorted(out_dir.glob('*.yaml')) if not p.name.startswith('_')]
     if imports: write_yaml(out_dir / '_root.yaml', {'imports': imports})
 
-def main():
+def main(argv=None):
+    global VALIDATOR
     try:
         ensure_deps()
         parser = argparse.ArgumentParser()
         parser.add_argument('--config', required=True)
         parser.add_argument('--force', '-y', action='store_true', help='Skip validation prompts')
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
+        VALIDATOR = DataValidator(); WRITTEN_COUNTS.clear()  # fresh state when called repeatedly in-process
         
         cpath = Path(args.config)
         if not cpath.exists(): sys.exit(1)
@@ -490,34 +539,37 @@ def main():
                 if i.is_file(): i.unlink()
         out_dir.mkdir(parents=True, exist_ok=True)
         
-        valid_files = []
+        preloaded = load_workbooks([p for p in inputs if p.exists()])
+        books = []
         for p in inputs:
             if not p.exists():
                 print(f"ERROR: {p.name} not found.", file=sys.stderr)
                 continue
-            if validate_structure(p, args.force):
-                valid_files.append(p)
+            if xls := validate_structure(p, args.force, preloaded.get(p)):
+                books.append(xls)
         
-        if not valid_files:
+        if not books:
             print("ERROR: No valid data files to process.", file=sys.stderr)
             sys.exit(1)
 
-        src_counts = count_entities_in_xlsx(valid_files)
-        processed = False
-        for p in valid_files:
+        src_counts, processed = {}, False
+        for xls in books:
             try:
-                xls = pd.ExcelFile(p)
-                if any(s in xls.sheet_names for s in ['Регионы','AZ','DC','Офисы']): convert_regions_az_dc_offices(p, out_dir); processed = True
-                if any(s in xls.sheet_names for s in ['Сегменты','Сети','Сетевые устройства']): convert_segments_nets_devices(p, out_dir); processed = True
-                if 'Сервисы КБ' in xls.sheet_names: convert_kb_services(p, out_dir); processed = True
-                if any(s in xls.sheet_names for s in ['Тех. сервисы','Tech Services']): convert_tech_services(p, out_dir); processed = True
-            except Exception as e: print(f"ERROR: {p.name}: {e}", file=sys.stderr)
+                converters = []
+                if any(s in xls.sheet_names for s in ['Регионы','AZ','DC','Офисы']): converters.append(convert_regions_az_dc_offices)
+                if any(s in xls.sheet_names for s in ['Сегменты','Сети','Сетевые устройства']): converters.append(convert_segments_nets_devices)
+                if 'Сервисы КБ' in xls.sheet_names: converters.append(convert_kb_services)
+                if any(s in xls.sheet_names for s in ['Тех. сервисы','Tech Services']): converters.append(convert_tech_services)
+                for convert in converters:
+                    processed = True
+                    for k, n in convert(xls, out_dir).items(): src_counts[k] = src_counts.get(k, 0) + n
+            except Exception as e: print(f"ERROR: {xls.path.name}: {e}", file=sys.stderr)
             
         if not processed: sys.exit(1)
         
         VALIDATOR.report()
         write_root(out_dir)
-        dst_counts = count_entities_in_yaml_dir(out_dir)
+        dst_counts = count_written_entities()
         print("\n--- Conversion Summary (SEAF2) ---")
         for k in sorted(list(set(src_counts.keys()) | set(dst_counts.keys()))):
             s, d = src_counts.get(k, 0), dst_counts.get(k, 0)
@@ -2,39 +2,119 @@ import sys
 import argparse
 from pathlib import Path
 from typing import Dict, Any, List
-import pandas as pd
+from collections import OrderedDict, Counter
+import datetime
 import yaml
 import re
+import hashlib
+import functools
+import json
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+
+try: from yaml import CSafeLoader as _Loader
+except ImportError: from yaml import SafeLoader as _Loader
 
 def ensure_deps():
-    try: import pandas, yaml, openpyxl
+    try: import yaml, openpyxl
     except ImportError:
         import subprocess
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pandas', 'openpyxl', 'pyyaml'])
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'openpyxl', 'pyyaml'])
+
+_YAML_CACHE: 'OrderedDict[str, tuple]' = OrderedDict()
+_YAML_CACHE_SIZE = 1024
+
+_TA_MARKER = b'seaf.company.ta.'
+
+_DISK_CACHE_MAX = 4096
+
+def _disk_cache_path(cache_dir: Path, path: Path) -> Path:
+    return cache_dir / (hashlib.sha1(str(path.resolve()).encode('utf-8')).hexdigest() + '.json')
+
+# YAML timestamps are the only non-JSON scalars the safe loader yields for SEAF data
+def _json_default(o):
+    if isinstance(o, datetime.datetime): return {'$datetime': o.isoformat()}
+    if isinstance(o, datetime.date): return {'$date': o.isoformat()}
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+def _json_hook(d):
+    if len(d) == 1:
+        if '$datetime' in d: return datetime.datetime.fromisoformat(d['$datetime'])
+        if '$date' in d: return datetime.date.fromisoformat(d['$date'])
+    return d
+
+def _write_disk_cache(cache_dir: Path, cpath: Path, stamp: tuple, data):
+    try: text = json.dumps({'stamp': list(stamp), 'data': data}, default=_json_default, ensure_ascii=False)
+    except (TypeError, ValueError): return
+    # JSON turns non-string keys into strings; such documents are not cached
+    if json.loads(text, object_hook=_json_hook)['data'] != data: return
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cpath.write_text(text, encoding='utf-8')
+    except OSError: pass
 
-def read_yaml(path: Path) -> Dict[str, Any]:
+# Keeps the newest _DISK_CACHE_MAX entries
+def prune_disk_cache(cache_dir: Path):
+    try:
+        entries = sorted((e for e in cache_dir.iterdir() if e.suffix == '.json' and len(e.stem) == 40), key=lambda e: e.stat().st_mtime_ns, reverse=True)
+        for e in entries[_DISK_CACHE_MAX:]: e.unlink(missing_ok=True)
+    except OSError: pass
+
+def read_yaml(path: Path, marker: bytes = None, cache_dir: Path = None) -> Dict[str, Any]:
     try:
         if not path.exists(): return {}
-        with path.open('r', encoding='utf-8') as f: return yaml.safe_load(f) or {}
+        st, key = path.stat(), str(path)
+        hit = _YAML_CACHE.get(key)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            _YAML_CACHE.move_to_end(key)
+            return hit[2]
+        stamp = (st.st_mtime_ns, st.st_size)
+        cpath = _disk_cache_path(cache_dir, path) if cache_dir else None
+        cached = None
+        if cpath:
+            try:
+                with cpath.open('r', encoding='utf-8') as f: cached = json.load(f, object_hook=_json_hook)
+                if tuple(cached['stamp']) != stamp: cached = None
+            except (OSError, ValueError, KeyError, TypeError): cached = None
+        if cached: data = cached['data']
+        else:
+            raw = path.read_bytes()
+            if marker and marker not in raw: return {}
+            data = yaml.load(raw.decode('utf-8'), Loader=_Loader) or {}
+            if cpath: _write_disk_cache(cache_dir, cpath, stamp, data)
+        _YAML_CACHE[key] = (st.st_mtime_ns, st.st_size, data)
+        if len(_YAML_CACHE) > _YAML_CACHE_SIZE: _YAML_CACHE.popitem(last=False)
+        return data
     except Exception: return {}
 
+
+_CYR_TRANS = str.maketrans('CAEOPXy', 'САЕОРХу')
+_CYR_SRC = frozenset('CAEOPXy')
+
 def normalize_val(val, default=None):
     if not val or not isinstance(val, str): return default if default else val
-    trans = str.maketrans('CAEOPXy', 'САЕОРХу')
-    return val.translate(trans).strip()
+    if _CYR_SRC.isdisjoint(val): return val.strip()
+    return val.translate(_CYR_TRANS).strip()
 
 def format_list(items: Any) -> str:
     if not items: return ''
     if isinstance(items, str): return items
-    return ', '.join(sorted([str(x) for x in items if x]))
+    if len(items) == 1:
+        x = next(iter(items))
+        return str(x) if x else ''
+    return ', '.join(sorted(map(str, filter(None, items))))
 
+_RE_DC = re.compile(r'\.dc(\d+)')
+_RE_OFFICE = re.compile(r'\.office\.([a-zA-Z0-9-]+)')
+
+@functools.lru_cache(maxsize=4096)
 def derive_location_from_network(net_id):
     if not net_id: return None
-    prefix = net_id.split('.')[0] if '.' in net_id else 'seaf'
-    m = re.search(r'\.dc(\d+)', net_id)
+    head, sep, _ = net_id.partition('.')
+    prefix = head if sep else 'seaf'
+    m = _RE_DC.search(net_id)
     if m: return f"{prefix}.dc.{m.group(1)}"
-    m = re.search(r'\.office\.([a-zA-Z0-9-]+)', net_id)
-    if m:
+    if _RE_OFFICE.search(net_id):
         parts = net_id.split('.')
         try:
             idx = parts.index('office')
@@ -74,128 +154,149 @@ ENTITY_MAP = {
     'k8s_hpa': ['seaf.company.ta.components.k8s_hpa']
 }
 
-def count_entities_in_yaml_dir(yaml_dir: Path) -> Dict[str, int]:
-    counts = {}
-    if not yaml_dir.exists(): return counts
-    rev_lookup = {}
-    for etype, keys in ENTITY_MAP.items():
-        for k in keys: rev_lookup[k] = etype
-    for p in sorted(yaml_dir.glob('**/*.yaml')):
-        data = read_yaml(p)
+_REV_LOOKUP = {k: etype for etype, keys in ENTITY_MAP.items() for k in keys}
+
+_PARALLEL_MIN_FILES = 32
+
+def _parse_one(path: Path, cache_dir: Path = None):
+    data = read_yaml(path, _TA_MARKER, cache_dir)
+    return {k: v for k, v in data.items() if k in _REV_LOOKUP} if isinstance(data, dict) else data
+
+def load_all(ydir: Path, cache_dir: Path = None) -> Dict[str, Any]:
+    if not ydir.exists(): return {}
+    # sorted: tech rows follow file order and later network files override earlier ids
+    paths = sorted(ydir.glob('**/*.yaml'))
+    results = None
+    if len(paths) >= _PARALLEL_MIN_FILES:
+        try:
+            with ProcessPoolExecutor() as ex: results = list(ex.map(_parse_one, paths, [cache_dir] * len(paths), chunksize=16))
+        except Exception: results = None
+    if results is None: results = [_parse_one(p, cache_dir) for p in paths]
+    if cache_dir: prune_disk_cache(cache_dir)
+    return {p.relative_to(ydir).as_posix(): data for p, data in zip(paths, results)}
+
+def count_entities_in_yaml_dir(docs: Dict[str, Any]) -> Dict[str, int]:
+    counts = Counter()
+    for data in docs.values():
         for key, val in data.items():
-            if key in rev_lookup and isinstance(val, dict):
-                ename = rev_lookup[key]
-                counts[ename] = counts.get(ename, 0) + len(val)
+            if key in _REV_LOOKUP and isinstance(val, dict): counts[_REV_LOOKUP[key]] += len(val)
     return counts
 
-def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
+_XL_TYPES = (str, int, float, bool, datetime.date, datetime.time, type(None))
+
+def write_sheet(wb: Workbook, title: str, headers: List[str], rows):
+    ws = wb.create_sheet(title=title)
+    ws.append(headers)
+    for row in rows: ws.append([v if isinstance(v, _XL_TYPES) else str(v) for v in row])
+
+def save_regions_az_dc_offices(docs: Dict[str, Any], wb: Workbook) -> Dict[str, int]:
     counts = {}
-    sheet_map = {'Регионы': 'regions', 'AZ': 'dc_az', 'DC': 'dc', 'Офисы': 'office', 'Сегменты': 'network_segment', 'Сети': 'network', 'Сервисы КБ': 'kb', 'Тех. сервисы': 'tech_services', 'Компоненты': 'components', 'Сетевые устройства': 'components', 'Связи': 'links', 'Стенды и окружения': 'stands'}
-    for fp in xlsx_files:
-        if not fp.exists(): continue
-        try:
-            xls = pd.ExcelFile(fp)
-            for sn in xls.sheet_names:
-                if sn in sheet_map:
-                    df = xls.parse(sn).dropna(how='all')
-                    ename = sheet_map[sn]
-                    if ename == 'tech_services':
-                        cmap = {'Compute Service': 'compute_service', 'Cluster': 'cluster', 'Monitoring': 'monitoring', 'Backup': 'backup', 'Software': 'software', 'Storage': 'storage', 'Cluster Virtualization': 'cluster_virtualization', 'K8s Cluster': 'k8s', 'Deployment': 'k8s_deployment'}
-                        for _, row in df.iterrows():
-                            etype = cmap.get(row.get('Класс'), 'compute_service')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    elif ename == 'components':
-                        cmap = {'Server': 'server', 'HW Storage': 'hw_storage', 'User Device': 'user_device', 'K8s Node': 'k8s_node', 'K8s Namespace': 'k8s_namespace', 'K8s HPA': 'k8s_hpa', 'Network Device': 'components.network'}
-                        for _, row in df.iterrows():
-                            etype = cmap.get(row.get('Класс'), 'components.network')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    else: counts[ename] = counts.get(ename, 0) + len(df)
-        except Exception: continue
+    for fn, key, sn in [('dc_region.yaml', 'seaf.company.ta.services.dc_regions', 'Регионы'), ('dc_az.yaml', 'seaf.company.ta.services.dc_azs', 'AZ'), ('dc.yaml', 'seaf.company.ta.services.dcs', 'DC'), ('dc_office.yaml', 'seaf.company.ta.services.dc_offices', 'Офисы')]:
+        d = docs.get(fn, {}).get(key, {})
+        if not d: continue
+        if sn == 'Регионы': headers, rows = ['ID Региона', 'Наименование', 'Описание'], ((i, p.get('title'), p.get('description')) for i, p in d.items())
+        elif sn == 'AZ': headers, rows = ['ID AZ', 'Наименование', 'Описание', 'Поставщик', 'Регион'], ((i, p.get('title'), p.get('description'), p.get('vendor'), p.get('region')) for i, p in d.items())
+        elif sn == 'DC': headers, rows = ['ID DC', 'Наименование', 'Описание', 'Поставщик', 'Tier', 'Тип', 'Кол-во стоек', 'Адрес', 'Форма владения', 'AZ'], ((i, p.get('title'), p.get('description'), p.get('vendor'), p.get('tier'), p.get('type'), p.get('rack_qty'), p.get('address'), p.get('ownership'), p.get('availabilityzone')) for i, p in d.items())
+        else: headers, rows = ['ID Офиса', 'Наименование', 'Описание', 'Адрес', 'Регион'], ((i, p.get('title'), p.get('description'), p.get('address'), p.get('region')) for i, p in d.items())
+        write_sheet(wb, sn, headers, rows)
+        counts[_REV_LOOKUP[key]] = len(d)
     return counts
 
-def save_regions_az_dc_offices(ydir: Path, writer: pd.ExcelWriter):
-    for fn, key, sn in [('dc_region.yaml', 'seaf.company.ta.services.dc_regions', 'Регионы'), ('dc_az.yaml', 'seaf.company.ta.services.dc_azs', 'AZ'), ('dc.yaml', 'seaf.company.ta.services.dcs', 'DC'), ('dc_office.yaml', 'seaf.company.ta.services.dc_offices', 'Офисы')]:
-        d = read_yaml(ydir / fn).get(key, {})
-        if d:
-            rows = []
-            for i, p in d.items():
-                if sn == 'Регионы': rows.append({'ID Региона': i, 'Наименование': p.get('title'), 'Описание': p.get('description')})
-                elif sn == 'AZ': rows.append({'ID AZ': i, 'Наименование': p.get('title'), 'Описание': p.get('description'), 'Поставщик': p.get('vendor'), 'Регион': p.get('region')})
-                elif sn == 'DC': rows.append({'ID DC': i, 'Наименование': p.get('title'), 'Описание': p.get('description'), 'Поставщик': p.get('vendor'), 'Tier': p.get('tier'), 'Тип': p.get('type'), 'Кол-во стоек': p.get('rack_qty'), 'Адрес': p.get('address'), 'Форма владения': p.get('ownership'), 'AZ': p.get('availabilityzone')})
-                elif sn == 'Офисы': rows.append({'ID Офиса': i, 'Наименование': p.get('title'), 'Описание': p.get('description'), 'Адрес': p.get('address'), 'Регион': p.get('region')})
-            if rows: pd.DataFrame(rows).to_excel(writer, sheet_name=sn, index=False)
-
-def save_segments_nets_devices(ydir: Path, writer: pd.ExcelWriter):
-    d = read_yaml(ydir / 'network_segment.yaml').get('seaf.company.ta.services.network_segments', {})
-    if d: pd.DataFrame([{'ID сетевые сегмента/зоны': i, 'Наименование': p.get('title'), 'Описание': p.get('description'), 'Расположение': (p.get('sber') or {}).get('location'), 'Зона': (p.get('sber') or {}).get('zone')} for i, p in d.items()]).to_excel(writer, sheet_name='Сегменты', index=False)
+def save_segments_nets_devices(docs: Dict[str, Any], wb: Workbook) -> Dict[str, int]:
+    d = docs.get('network_segment.yaml', {}).get('seaf.company.ta.services.network_segments', {})
+    if d: write_sheet(wb, 'Сегменты', ['ID сетевые сегмента/зоны', 'Наименование', 'Описание', 'Расположение', 'Зона'], ((i, p.get('title'), p.get('description'), (sber := p.get('sber') or {}).get('location'), sber.get('zone')) for i, p in d.items()))
     nets = {}
-    for p in sorted(ydir.glob('network*.yaml')):
-        if not p.name.startswith('_') and p.name not in ['network_segment.yaml', 'network_component.yaml']:
-            nets.update(read_yaml(p).get('seaf.company.ta.services.networks', {}))
+    for fn, data in docs.items():
+        if fn.startswith('network') and '/' not in fn and fn not in ['network_segment.yaml', 'network_component.yaml']:
+            nets.update(data.get('seaf.company.ta.services.networks', {}))
     if nets:
-        rows = [{'ID Network': i, 'Наименование': p.get('title'), 'Описание': p.get('description'), 'Тип сети': p.get('type'), 'VLAN': p.get('vlan'), 'VRF  ': p.get('VRF'), 'Провайдер': p.get('provider') or (p.get('sber') or {}).get('provider'), 'Тип сети (проводная, беспроводная)': p.get('lan_type'), 'Адрес сети': p.get('ipnetwork'), 'WAN Адрес': p.get('wan_ip'), 'Расположение': format_list(p.get('location')), 'Сетевой сегмент/зона(ID)': format_list(p.get('segment'))} for i, p in nets.items()]
-        pd.DataFrame(rows).to_excel(writer, sheet_name='Сети', index=False)
+        headers = ['ID Network', 'Наименование', 'Описание', 'Тип сети', 'VLAN', 'VRF  ', 'Провайдер', 'Тип сети (проводная, беспроводная)', 'Адрес сети', 'WAN Адрес', 'Расположение', 'Сетевой сегмент/зона(ID)']
+        rows = ((i, p.get('title'), p.get('description'), p.get('type'), p.get('vlan'), p.get('VRF'), p.get('provider') or (p.get('sber') or {}).get('provider'), p.get('lan_type'), p.get('ipnetwork'), p.get('wan_ip'), format_list(p.get('location')), format_list(p.get('segment'))) for i, p in nets.items())
+        write_sheet(wb, 'Сети', headers, rows)
+    counts = {'network_segment': len(d), 'network': len(nets)}
     devs = {}
-    for p in sorted(ydir.glob('network_component*.yaml')): devs.update(read_yaml(p).get('seaf.company.ta.components.networks', {}))
-    if devs: pd.DataFrame([{'ID Устройства': i, 'Наименование': p.get('title'), 'Тип реализации': p.get('realization_type'), 'Тип': p.get('type'), 'Модель': p.get('model'), 'Назначение': p.get('purpose'), 'IP адрес': p.get('address'), 'Описание': p.get('description'), 'Расположение (ID сегмента/зоны)': p.get('segment'), 'Подключенные сети (список)': format_list(p.get('network_connection'))} for i, p in devs.items()]).to_excel(writer, sheet_name='Сетевые устройства', index=False)
-
-def save_kb_services(ydir: Path, writer: pd.ExcelWriter):
-    d = read_yaml(ydir / 'kb.yaml').get('seaf.company.ta.services.kbs', {})
-    if not d: return
-    rows = [{'ID КБ сервиса': i, 'Tag': p.get('tag'), 'Описание': p.get('description'), 'Технология': p.get('technology'), 'Название ПО': p.get('software_name'), 'Статус': p.get('status'), 'Подключенные сети': format_list(p.get('network_connection'))} for i, p in d.items()]
-    pd.DataFrame(rows).to_excel(writer, sheet_name='Сервисы КБ', index=False)
-
-def save_tech_services(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    kmap = {
-        'seaf.company.ta.services.compute_services': 'Compute Service',
-        'seaf.company.ta.services.clusters': 'Cluster',
-        'seaf.company.ta.services.monitorings': 'Monitoring',
-        'seaf.company.ta.services.backups': 'Backup',
-        'seaf.company.ta.services.softwares': 'Software',
-        'seaf.company.ta.services.storages': 'Storage',
-        'seaf.company.ta.services.cluster_virtualizations': 'Cluster Virtualization',
-        'seaf.company.ta.services.k8s': 'K8s Cluster',
-        'seaf.company.ta.services.k8s_deployments': 'Deployment'
-    }
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
+    for fn, data in docs.items():
+        if fn.startswith('network_component') and '/' not in fn: devs.update(data.get('seaf.company.ta.components.networks', {}))
+    counts['components.network'] = len(devs)
+    if devs: write_sheet(wb, 'Сетевые устройства', ['ID Устройства', 'Наименование', 'Тип реализации', 'Тип', 'Модель', 'Назначение', 'IP адрес', 'Описание', 'Расположение (ID сегмента/зоны)', 'Подключенные сети (список)'], ((i, p.get('title'), p.get('realization_type'), p.get('type'), p.get('model'), p.get('purpose'), p.get('address'), p.get('description'), p.get('segment'), format_list(p.get('network_connection'))) for i, p in devs.items()))
+    return counts
+
+def save_kb_services(docs: Dict[str, Any], wb: Workbook) -> Dict[str, int]:
+    d = docs.get('kb.yaml', {}).get('seaf.company.ta.services.kbs', {})
+    if not d: return {}
+    rows = ((i, p.get('tag'), p.get('description'), p.get('technology'), p.get('software_name'), p.get('status'), format_list(p.get('network_connection'))) for i, p in d.items())
+    write_sheet(wb, 'Сервисы КБ', ['ID КБ сервиса', 'Tag', 'Описание', 'Технология', 'Название ПО', 'Статус', 'Подключенные сети'], rows)
+    return {'kb': len(d)}
+
+_TECH_KMAP = {
+    'seaf.company.ta.services.compute_services': 'Compute Service',
+    'seaf.company.ta.services.clusters': 'Cluster',
+    'seaf.company.ta.services.monitorings': 'Monitoring',
+    'seaf.company.ta.services.backups': 'Backup',
+    'seaf.company.ta.services.softwares': 'Software',
+    'seaf.company.ta.services.storages': 'Storage',
+    'seaf.company.ta.services.cluster_virtualizations': 'Cluster Virtualization',
+    'seaf.company.ta.services.k8s': 'K8s Cluster',
+    'seaf.company.ta.services.k8s_deployments': 'Deployment'
+}
+_TECH_HEADERS = ['Идентификатор', 'Наименование', 'Описание', 'Подключен к сети', 'ЦОД', 'Класс']
+
+def _iter_tech_entities(docs: Dict[str, Any]):
+    for data in docs.values():
         for rkey, ent in data.items():
-            if rkey in kmap:
-                cls = kmap[rkey]
-                for i, d in ent.items():
-                    ls = list(d.get('location') or [])
-                    if not ls:
-                        for n in (d.get('network_connection') or []):
-                            if l := derive_location_from_network(n): ls.append(l)
-                    obj = {'Идентификатор': i, 'Наименование': d.get('title'), 'Описание': d.get('description'), 'Подключен к сети': format_list(d.get('network_connection')), 'ЦОД': format_list(list(set(ls))), 'Класс': cls}
-                    if 'compute' in rkey or 'cluster' in rkey: obj['Тип сервиса'] = normalize_val(d.get('service_type'), 'Серверы приложений и т.д.')
-                    if 'cluster' in rkey and 'reservation_type' in d: obj['Тип резервирования'] = d['reservation_type']
-                    rows.append(obj)
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Тех. сервисы', index=False)
-
-def main():
+            if rkey in _TECH_KMAP:
+                for i, d in ent.items(): yield rkey, i, d
+
+def _iter_tech_rows(docs: Dict[str, Any], with_svc: bool, with_res: bool):
+    for rkey, i, d in _iter_tech_entities(docs):
+        ls = list(d.get('location') or [])
+        if not ls:
+            for n in (d.get('network_connection') or []):
+                if l := derive_location_from_network(n): ls.append(l)
+        row = [i, d.get('title'), d.get('description'), format_list(d.get('network_connection')), format_list(list(set(ls))), _TECH_KMAP[rkey]]
+        if with_svc: row.append(normalize_val(d.get('service_type'), 'Серверы приложений и т.д.') if 'compute' in rkey or 'cluster' in rkey else None)
+        if with_res: row.append(d['reservation_type'] if 'cluster' in rkey and 'reservation_type' in d else None)
+        yield row
+
+def save_tech_services(docs: Dict[str, Any], wb: Workbook) -> Dict[str, int]:
+    counts = Counter()
+    with_svc = with_res = False
+    for rkey, _, d in _iter_tech_entities(docs):
+        counts[_REV_LOOKUP[rkey]] += 1
+        if 'compute' in rkey or 'cluster' in rkey: with_svc = True
+        if 'cluster' in rkey and 'reservation_type' in d: with_res = True
+    if not counts: return counts
+    headers = _TECH_HEADERS + ['Тип сервиса'] * with_svc + ['Тип резервирования'] * with_res
+    write_sheet(wb, 'Тех. сервисы', headers, _iter_tech_rows(docs, with_svc, with_res))
+    return counts
+
+def main(argv=None):
     try:
         ensure_deps()
-        parser = argparse.ArgumentParser(); parser.add_argument('--config', required=True); args = parser.parse_args()
+        parser = argparse.ArgumentParser(); parser.add_argument('--config', required=True); parser.add_argument('--no-report', action='store_true'); args = parser.parse_args(argv)
         cpath = Path(args.config)
         if not cpath.exists(): print(f"ERROR: Config not found: {cpath}", file=sys.stderr); sys.exit(1)
-        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.safe_load(f) or {}
+        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.load(f, Loader=_Loader) or {}
         ydir, odir = cpath.parent / cfg.get('yaml_dir', '.'), cpath.parent / cfg.get('out_xlsx_dir', '.')
         odir.mkdir(parents=True, exist_ok=True)
-        src_counts = count_entities_in_yaml_dir(ydir)
+        cache_dir = cpath.parent / cfg['cache_dir'] if cfg.get('cache_dir') else None
+        docs = load_all(ydir, cache_dir)
+        dst_counts = Counter()
         for p in [odir / f for f in cfg.get('xlsx_files', [])]:
             try:
-                with pd.ExcelWriter(p, engine='openpyxl') as writer:
-                    name = p.name.lower()
-                    if 'reg' in name: save_regions_az_dc_offices(ydir, writer)
-                    if 'seg' in name: save_segments_nets_devices(ydir, writer)
-                    if 'kb' in name: save_kb_services(ydir, writer)
-                    if 'tech' in name or name == 'services.xlsx': save_tech_services(ydir, writer)
-                    if not writer.book.sheetnames: pd.DataFrame([{'Info': 'No data'}]).to_excel(writer, sheet_name='Empty')
+                wb, written = Workbook(write_only=True), []
+                name = p.name.lower()
+                if 'reg' in name: written.append(save_regions_az_dc_offices(docs, wb))
+                if 'seg' in name: written.append(save_segments_nets_devices(docs, wb))
+                if 'kb' in name: written.append(save_kb_services(docs, wb))
+                if 'tech' in name or name == 'services.xlsx': written.append(save_tech_services(docs, wb))
+                if not wb.sheetnames: write_sheet(wb, 'Empty', [None, 'Info'], [[0, 'No data']])
+                wb.save(p)
+                for c in written: dst_counts += Counter(c)
                 print(f"Written data to {p.name}")
             except Exception as e: print(f"ERROR: Failed to write {p.name}: {e}", file=sys.stderr)
-        dst_counts = count_entities_in_xlsx([odir / f for f in cfg.get('xlsx_files', [])])
+        if args.no_report: return
+        src_counts = count_entities_in_yaml_dir(docs)
         print("\n--- Conversion Summary ---")
         for k in sorted(list(set(src_counts.keys()) | set(dst_counts.keys()))):
             s, d = src_counts.get(k, 0), dst_counts.get(k, 0)
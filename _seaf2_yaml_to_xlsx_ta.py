@@ -1,41 +1,85 @@
+import os
 import sys
 import argparse
 from pathlib import Path
-from typing import Dict, Any, List
-import pandas as pd
+from typing import Dict, Any, List, Tuple
 import yaml
 import re
+import datetime
+import functools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook, load_workbook
+
+try: from yaml import CSafeLoader as _Loader
+except ImportError: from yaml import SafeLoader as _Loader
 
 def ensure_deps():
-    try: import pandas, yaml, openpyxl
+    try: import yaml, openpyxl
     except ImportError:
         import subprocess
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pandas', 'openpyxl', 'pyyaml'])
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'openpyxl', 'pyyaml'])
+    if not getattr(yaml, '__with_libyaml__', False): print("WARNING: PyYAML is built without libyaml, YAML parsing will be slow", file=sys.stderr)
+
+KEY_MARKERS = (b'seaf.company.ta.', b'seaf.ta.')
+_REVERSE_PREFIX = 'seaf.ta.reverse.'
 
-def read_yaml(path: Path) -> Dict[str, Any]:
+def read_yaml(path: Path, markers: Tuple[bytes, ...] = ()) -> Dict[str, Any]:
     try:
         if not path.exists(): return {}
-        with path.open('r', encoding='utf-8') as f: return yaml.safe_load(f) or {}
+        raw = path.read_bytes()
+        if markers and not any(m in raw for m in markers): return {}
+        return yaml.load(raw, Loader=_Loader) or {}
     except Exception: return {}
 
+def walk_yaml(ydir: Path) -> List[Path]:
+    found = []
+    def walk(d: str):
+        try:
+            with os.scandir(d) as it: entries = sorted(it, key=lambda e: e.name)
+        except OSError: return  # unreadable directory: skip it, as glob did
+        for e in entries:
+            if e.is_dir(follow_symlinks=False):
+                if not e.name.startswith('.'): walk(e.path)
+            elif e.name.endswith('.yaml') and e.is_file(): found.append(Path(e.path))
+    walk(str(ydir))
+    return found
+
+_PARALLEL_MIN_FILES = 32
+
+def load_all_yaml(ydir: Path) -> List[Tuple[Path, Dict[str, Any]]]:
+    if not ydir.is_dir(): return []
+    paths = walk_yaml(ydir)
+    if len(paths) >= _PARALLEL_MIN_FILES:
+        try:
+            with ProcessPoolExecutor() as ex: return list(zip(paths, ex.map(read_yaml, paths, [KEY_MARKERS] * len(paths), chunksize=8)))
+        except Exception: pass
+    return [(p, read_yaml(p, KEY_MARKERS)) for p in paths]
+
+_CYRILLIC_TRANS = str.maketrans('CAEOPXy', 'САЕОРХу')
+
 def normalize_val(val, default=None):
-    if not val or not isinstance(val, str): return default if default else val
-    trans = str.maketrans('CAEOPXy', 'САЕОРХу')
-    return val.translate(trans).strip()
+    if not isinstance(val, str) or not val: return default if default else val
+    return val.translate(_CYRILLIC_TRANS).strip()
 
 def format_list(items: Any) -> str:
     if not items: return ''
     if isinstance(items, str): return items
-    if isinstance(items, list): return ', '.join(sorted([str(x) for x in items if x]))
+    if isinstance(items, list):
+        if all(type(x) is str and x for x in items): return ', '.join(sorted(items))
+        return ', '.join(sorted([str(x) for x in items if x]))
     return str(items)
 
+_DC_RE = re.compile(r'\.dc(\d+)')
+_OFFICE_RE = re.compile(r'\.office\.([a-zA-Z0-9-]+)')
+
+@functools.lru_cache(maxsize=8192)
 def derive_location_from_network(net_id):
-    if not net_id: return None
+    if not net_id or ('.dc' not in net_id and '.office.' not in net_id): return None
     prefix = net_id.split('.')[0] if '.' in net_id else 'seaf'
-    m = re.search(r'\.dc(\d+)', net_id)
+    m = _DC_RE.search(net_id)
     if m: return f"{prefix}.dc.{m.group(1)}"
-    m = re.search(r'\.office\.([a-zA-Z0-9-]+)', net_id)
-    if m:
+    if _OFFICE_RE.search(net_id):
         parts = net_id.split('.')
         try:
             idx = parts.index('office')
@@ -97,24 +141,25 @@ CLASS_NAME_MAP = {
     'environment': 'Environment'
 }
 
-def count_entities_in_yaml_dir(yaml_dir: Path) -> Dict[str, int]:
-    counts = {}
-    if not yaml_dir.exists(): return counts
-    rev_lookup = {}
-    for etype, keys in ENTITY_MAP.items():
-        for k in keys: rev_lookup[k] = etype
-    for p in sorted(yaml_dir.glob('**/*.yaml')):
-        data = read_yaml(p)
+KEY_TO_ETYPE = {k: etype for etype, keys in ENTITY_MAP.items() for k in keys}
+KEY_TO_CLASS = {k: CLASS_NAME_MAP[etype] for etype, keys in ENTITY_MAP.items() for k in keys if etype in CLASS_NAME_MAP}
+CLASS_TO_ETYPE = {v: k for k, v in CLASS_NAME_MAP.items()}
+TECH_SERVICE_ETYPES = frozenset(['compute_service', 'cluster', 'monitoring', 'backup', 'software', 'storage', 'cluster_virtualization', 'k8s', 'k8s_deployment'])
+COMPONENT_ETYPES = frozenset(['server', 'hw_storage', 'user_device', 'k8s_node', 'k8s_namespace', 'k8s_hpa'])
+LINK_ETYPES = frozenset(['logical_link', 'network_link'])
+STAND_ETYPES = frozenset(['stand', 'environment'])
+CLASS_DEFAULTS = {'tech_services': 'compute_service', 'components': 'server', 'links': 'logical_link', 'stands': 'stand'}
+
+def count_entities_in_yaml_dir(files: List[Tuple[Path, Dict[str, Any]]]) -> Dict[str, int]:
+    counts = Counter()
+    for p, data in files:
         for key, val in data.items():
-            if key in rev_lookup and isinstance(val, dict):
-                etype = rev_lookup[key]
-                counts[etype] = counts.get(etype, 0) + len(val)
-            elif key.startswith('seaf.ta.reverse.'):
-                counts['reverse'] = counts.get('reverse', 0) + len(val)
+            if key in KEY_TO_ETYPE and isinstance(val, dict): counts[KEY_TO_ETYPE[key]] += len(val)
+            elif key.startswith(_REVERSE_PREFIX): counts['reverse'] += len(val)
     return counts
 
 def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
-    counts = {}
+    counts = Counter()
     # Use internal keys from ENTITY_MAP for sheet mapping consistency
     sheet_map = {
         'Регионы': 'dc_region', 'AZ': 'dc_az', 'DC': 'dc', 'Офисы': 'office', 
@@ -123,160 +168,112 @@ def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
         'Сетевые устройства': 'components.network', 'Связи': 'links', 
         'Стенды и окружения': 'stands', 'Reverse': 'reverse'
     }
-    # Reverse map for display names back to internal keys
-    rev_class_map = {v: k for k, v in CLASS_NAME_MAP.items()}
 
     for fp in xlsx_files:
         if not fp.exists(): continue
         try:
-            xls = pd.ExcelFile(fp)
-            for sn in xls.sheet_names:
-                if sn in sheet_map:
-                    df = xls.parse(sn).dropna(how='all')
+            wb = load_workbook(fp, read_only=True, data_only=True)
+            try:
+                for sn in wb.sheetnames:
+                    if sn not in sheet_map: continue
+                    rows = wb[sn].iter_rows(values_only=True)
+                    header = next(rows, ())
+                    rows = (r for r in rows if any(c is not None and c != '' for c in r))
                     ename = sheet_map[sn]
-                    if ename == 'tech_services':
-                        for _, row in df.iterrows():
-                            cls_raw = row.get('Класс')
-                            etype = rev_class_map.get(cls_raw, 'compute_service')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    elif ename == 'components':
-                        for _, row in df.iterrows():
-                            cls_raw = row.get('Класс')
-                            etype = rev_class_map.get(cls_raw, 'server')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    elif ename == 'links':
-                        for _, row in df.iterrows():
-                            cls_raw = row.get('Класс')
-                            etype = rev_class_map.get(cls_raw, 'logical_link')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    elif ename == 'stands':
-                        for _, row in df.iterrows():
-                            cls_raw = row.get('Класс')
-                            etype = rev_class_map.get(cls_raw, 'stand')
-                            counts[etype] = counts.get(etype, 0) + 1
-                    else: counts[ename] = counts.get(ename, 0) + len(df)
+                    if ename in CLASS_DEFAULTS:
+                        default = CLASS_DEFAULTS[ename]
+                        idx = header.index('Класс') if 'Класс' in header else None
+                        counts.update(CLASS_TO_ETYPE.get(r[idx] if idx is not None and idx < len(r) else None, default) for r in rows)
+                    else: counts[ename] += sum(1 for _ in rows)
+            finally: wb.close()
         except Exception: continue
     return counts
 
-def save_regions_az_dc_offices(ydir: Path, writer: pd.ExcelWriter):
-    rows_reg, rows_az, rows_dc, rows_off = [], [], [], []
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for k, d in data.items():
-            if k in ENTITY_MAP['dc_region']:
-                for i, v in d.items(): rows_reg.append({'ID Региона': i, 'Наименование': v.get('title'), 'Описание': v.get('description')})
-            elif k in ENTITY_MAP['dc_az']:
-                for i, v in d.items(): rows_az.append({'ID AZ': i, 'Наименование': v.get('title'), 'Описание': v.get('description'), 'Поставщик': v.get('vendor'), 'Регион': v.get('region')})
-            elif k in ENTITY_MAP['dc']:
-                for i, v in d.items(): rows_dc.append({'ID DC': i, 'Наименование': v.get('title'), 'Описание': v.get('description'), 'Поставщик': v.get('vendor'), 'Tier': v.get('tier'), 'Тип': v.get('type'), 'Кол-во стоек': v.get('rack_qty'), 'Адрес': v.get('address'), 'Форма владения': v.get('ownership'), 'AZ': v.get('availabilityzone')})
-            elif k in ENTITY_MAP['office']:
-                for i, v in d.items(): rows_off.append({'ID Офиса': i, 'Наименование': v.get('title'), 'Описание': v.get('description'), 'Адрес': v.get('address'), 'Регион': v.get('region')})
-    if rows_reg: pd.DataFrame(rows_reg).to_excel(writer, sheet_name='Регионы', index=False)
-    if rows_az: pd.DataFrame(rows_az).to_excel(writer, sheet_name='AZ', index=False)
-    if rows_dc: pd.DataFrame(rows_dc).to_excel(writer, sheet_name='DC', index=False)
-    if rows_off: pd.DataFrame(rows_off).to_excel(writer, sheet_name='Офисы', index=False)
+HEADERS = {
+    'Регионы': ['ID Региона', 'Наименование', 'Описание'],
+    'AZ': ['ID AZ', 'Наименование', 'Описание', 'Поставщик', 'Регион'],
+    'DC': ['ID DC', 'Наименование', 'Описание', 'Поставщик', 'Tier', 'Тип', 'Кол-во стоек', 'Адрес', 'Форма владения', 'AZ'],
+    'Офисы': ['ID Офиса', 'Наименование', 'Описание', 'Адрес', 'Регион'],
+    'Сегменты': ['ID сетевые сегмента/зоны', 'Наименование', 'Описание', 'Расположение', 'Зона'],
+    'Сети': ['ID Network', 'Наименование', 'Описание', 'Тип сети', 'VLAN', 'VRF  ', 'Провайдер', 'Тип сети (проводная, беспроводная)', 'Адрес сети', 'WAN Адрес', 'Расположение', 'Сетевой сегмент/зона(ID)'],
+    'Сетевые устройства': ['ID Устройства', 'Наименование', 'Тип реализации', 'Тип', 'Модель', 'Назначение', 'IP адрес', 'Описание', 'Расположение (ID сегмента/зоны)', 'Подключенные сети (список)'],
+    'Сервисы КБ': ['ID КБ сервиса', 'Tag', 'Описание', 'Технология', 'Название ПО', 'Статус', 'Подключенные сети'],
+    'Тех. сервисы': ['Идентификатор', 'Наименование', 'Описание', 'Подключен к сети', 'ЦОД', 'Класс', 'Тип сервиса', 'Тип резервирования'],
+    'Компоненты': ['Идентификатор', 'Наименование', 'Описание', 'Класс', 'Тип', 'Локация', 'Сети', 'Сегмент'],
+    'Связи': ['Идентификатор', 'Описание', 'Класс', 'Источник', 'Приемник', 'Направление', 'Сети'],
+    'Стенды и окружения': ['Идентификатор', 'Наименование', 'Описание', 'Класс'],
+    'Reverse': ['Namespace', 'ID', 'Name', 'Type', 'VPC', 'AZ', 'Subnets', 'Description']
+}
 
-def save_segments_nets_devices(ydir: Path, writer: pd.ExcelWriter):
-    rows_seg, rows_net, rows_dev = [], [], []
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for k, d in data.items():
-            if k in ENTITY_MAP['network_segment']:
-                for i, v in d.items(): rows_seg.append({'ID сетевые сегмента/зоны': i, 'Наименование': v.get('title'), 'Описание': v.get('description'), 'Расположение': (v.get('sber') or {}).get('location'), 'Зона': (v.get('sber') or {}).get('zone')})
-            elif k in ENTITY_MAP['network']:
-                for i, v in d.items(): rows_net.append({'ID Network': i, 'Наименование': v.get('title'), 'Описание': v.get('description'), 'Тип сети': v.get('type'), 'VLAN': v.get('vlan'), 'VRF  ': v.get('VRF'), 'Провайдер': v.get('provider') or (v.get('sber') or {}).get('provider'), 'Тип сети (проводная, беспроводная)': v.get('lan_type'), 'Адрес сети': v.get('ipnetwork'), 'WAN Адрес': v.get('wan_ip'), 'Расположение': format_list(v.get('location')), 'Сетевой сегмент/зона(ID)': format_list(v.get('segment'))})
-            elif k in ENTITY_MAP['components.network']:
-                for i, v in d.items(): rows_dev.append({'ID Устройства': i, 'Наименование': v.get('title'), 'Тип реализации': v.get('realization_type'), 'Тип': v.get('type'), 'Модель': v.get('model'), 'Назначение': v.get('purpose'), 'IP адрес': v.get('address'), 'Описание': v.get('description'), 'Расположение (ID сегмента/зоны)': v.get('segment'), 'Подключенные сети (список)': format_list(v.get('network_connection'))})
-    if rows_seg: pd.DataFrame(rows_seg).to_excel(writer, sheet_name='Сегменты', index=False)
-    if rows_net: pd.DataFrame(rows_net).to_excel(writer, sheet_name='Сети', index=False)
-    if rows_dev: pd.DataFrame(rows_dev).to_excel(writer, sheet_name='Сетевые устройства', index=False)
+_XL_TYPES = (str, int, float, bool, datetime.date, datetime.time, type(None))
 
-def save_kb_services(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for k, d in data.items():
-            if k in ENTITY_MAP['kb']:
-                for i, v in d.items(): rows.append({'ID КБ сервиса': i, 'Tag': v.get('tag'), 'Описание': v.get('description'), 'Технология': v.get('technology'), 'Название ПО': v.get('software_name'), 'Статус': v.get('status'), 'Подключенные сети': format_list(v.get('network_connection'))})
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Сервисы КБ', index=False)
+MISSING = object()
 
-def save_tech_services(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    kmap = {}
-    for etype, keys in ENTITY_MAP.items():
-        if etype in ['compute_service', 'cluster', 'monitoring', 'backup', 'software', 'storage', 'cluster_virtualization', 'k8s', 'k8s_deployment']:
-            for k in keys: kmap[k] = CLASS_NAME_MAP[etype]
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for rkey, ent in data.items():
-            if rkey in kmap:
-                cls = kmap[rkey]
-                for i, d in ent.items():
-                    ls = list(d.get('location') or [])
-                    if not ls:
-                        for n in (d.get('network_connection') or []):
-                            if l := derive_location_from_network(n): ls.append(l)
-                    obj = {'Идентификатор': i, 'Наименование': d.get('title'), 'Описание': d.get('description'), 'Подключен к сети': format_list(d.get('network_connection')), 'ЦОД': format_list(list(set(ls))), 'Класс': cls}
-                    if 'Compute' in cls or 'Cluster' in cls: obj['Тип сервиса'] = normalize_val(d.get('service_type'), 'Серверы приложений и т.д.')
-                    if 'Cluster' in cls and 'reservation_type' in d: obj['Тип резервирования'] = d['reservation_type']
-                    rows.append(obj)
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Тех. сервисы', index=False)
+def write_sheet(wb: Workbook, title: str, rows: List[tuple]):
+    headers = HEADERS[title]
+    cols = [j for j in range(len(headers)) if any(r[j] is not MISSING for r in rows)]
+    ws = wb.create_sheet(title=title)
+    ws.append([headers[j] for j in cols])
+    for r in rows: ws.append([v if isinstance(v, _XL_TYPES) else None if v is MISSING else str(v) for v in (r[j] for j in cols)])
 
-def save_components(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    cmap = {}
-    for etype, keys in ENTITY_MAP.items():
-        if etype in ['server', 'hw_storage', 'user_device', 'k8s_node', 'k8s_namespace', 'k8s_hpa']:
-            for k in keys: cmap[k] = CLASS_NAME_MAP[etype]
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for rkey, ent in data.items():
-            if rkey in cmap:
-                cls = cmap[rkey]
-                for i, d in ent.items():
-                    rows.append({'Идентификатор': i, 'Наименование': d.get('title'), 'Описание': d.get('description'), 'Класс': cls, 'Тип': d.get('type') or d.get('device_type'), 'Локация': format_list(d.get('location')), 'Сети': format_list(d.get('network_connection') or d.get('subnets')), 'Сегмент': d.get('segment')})
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Компоненты', index=False)
+def _rows_region(k, d): return ((i, v.get('title'), v.get('description')) for i, v in d.items())
+def _rows_az(k, d): return ((i, v.get('title'), v.get('description'), v.get('vendor'), v.get('region')) for i, v in d.items())
+def _rows_dc(k, d): return ((i, v.get('title'), v.get('description'), v.get('vendor'), v.get('tier'), v.get('type'), v.get('rack_qty'), v.get('address'), v.get('ownership'), v.get('availabilityzone')) for i, v in d.items())
+def _rows_office(k, d): return ((i, v.get('title'), v.get('description'), v.get('address'), v.get('region')) for i, v in d.items())
+def _rows_segment(k, d): return ((i, v.get('title'), v.get('description'), (v.get('sber') or {}).get('location'), (v.get('sber') or {}).get('zone')) for i, v in d.items())
+def _rows_network(k, d): return ((i, v.get('title'), v.get('description'), v.get('type'), v.get('vlan'), v.get('VRF'), v.get('provider') or (v.get('sber') or {}).get('provider'), v.get('lan_type'), v.get('ipnetwork'), v.get('wan_ip'), format_list(v.get('location')), format_list(v.get('segment'))) for i, v in d.items())
+def _rows_device(k, d): return ((i, v.get('title'), v.get('realization_type'), v.get('type'), v.get('model'), v.get('purpose'), v.get('address'), v.get('description'), v.get('segment'), format_list(v.get('network_connection'))) for i, v in d.items())
+def _rows_kb(k, d): return ((i, v.get('tag'), v.get('description'), v.get('technology'), v.get('software_name'), v.get('status'), format_list(v.get('network_connection'))) for i, v in d.items())
 
-def save_links(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    cmap = {}
-    for etype, keys in ENTITY_MAP.items():
-        if etype in ['logical_link', 'network_link']:
-            for k in keys: cmap[k] = CLASS_NAME_MAP[etype]
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for rkey, ent in data.items():
-            if rkey in cmap:
-                cls = cmap[rkey]
-                for i, d in ent.items():
-                    rows.append({'Идентификатор': i, 'Описание': d.get('description'), 'Класс': cls, 'Источник': d.get('source'), 'Приемник': format_list(d.get('target')), 'Направление': d.get('direction'), 'Сети': format_list(d.get('network_connection'))})
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Связи', index=False)
+def _rows_tech(k, ent):
+    cls = KEY_TO_CLASS[k]
+    for i, d in ent.items():
+        ls = list(d.get('location') or [])
+        if not ls:
+            for n in (d.get('network_connection') or []):
+                if l := derive_location_from_network(n): ls.append(l)
+        svc = normalize_val(d.get('service_type'), 'Серверы приложений и т.д.') if 'Compute' in cls or 'Cluster' in cls else MISSING
+        res = d['reservation_type'] if 'Cluster' in cls and 'reservation_type' in d else MISSING
+        yield (i, d.get('title'), d.get('description'), format_list(d.get('network_connection')), format_list(list(dict.fromkeys(ls))), cls, svc, res)
 
-def save_stands(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    cmap = {}
-    for etype, keys in ENTITY_MAP.items():
-        if etype in ['stand', 'environment']:
-            for k in keys: cmap[k] = CLASS_NAME_MAP[etype]
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for rkey, ent in data.items():
-            if rkey in cmap:
-                cls = cmap[rkey]
-                for i, d in ent.items():
-                    rows.append({'Идентификатор': i, 'Наименование': d.get('title'), 'Описание': d.get('description'), 'Класс': cls})
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Стенды и окружения', index=False)
+def _rows_component(k, ent): return ((i, d.get('title'), d.get('description'), KEY_TO_CLASS[k], d.get('type') or d.get('device_type'), format_list(d.get('location')), format_list(d.get('network_connection') or d.get('subnets')), d.get('segment')) for i, d in ent.items())
+def _rows_link(k, ent): return ((i, d.get('description'), KEY_TO_CLASS[k], d.get('source'), format_list(d.get('target')), d.get('direction'), format_list(d.get('network_connection'))) for i, d in ent.items())
+def _rows_stand(k, ent): return ((i, d.get('title'), d.get('description'), KEY_TO_CLASS[k]) for i, d in ent.items())
+def _rows_reverse(k, val): return ((k[len(_REVERSE_PREFIX):], i, v.get('name'), v.get('type'), v.get('vpc_id'), v.get('az'), format_list(v.get('subnets')), v.get('description')) for i, v in val.items())
 
-def save_reverse(ydir: Path, writer: pd.ExcelWriter):
-    rows = []
-    for p in sorted(ydir.glob('**/*.yaml')):
-        data = read_yaml(p)
-        for key, val in data.items():
-            if key.startswith('seaf.ta.reverse.'):
-                ns = key.replace('seaf.ta.reverse.', '')
-                for i, v in val.items():
-                    rows.append({'Namespace': ns, 'ID': i, 'Name': v.get('name'), 'Type': v.get('type'), 'VPC': v.get('vpc_id'), 'AZ': v.get('az'), 'Subnets': format_list(v.get('subnets')), 'Description': v.get('description')})
-    if rows: pd.DataFrame(rows).to_excel(writer, sheet_name='Reverse', index=False)
+ETYPE_SHEETS = {
+    'dc_region': ('Регионы', _rows_region), 'dc_az': ('AZ', _rows_az), 'dc': ('DC', _rows_dc), 'office': ('Офисы', _rows_office),
+    'network_segment': ('Сегменты', _rows_segment), 'network': ('Сети', _rows_network), 'components.network': ('Сетевые устройства', _rows_device),
+    'kb': ('Сервисы КБ', _rows_kb),
+    **{e: ('Тех. сервисы', _rows_tech) for e in TECH_SERVICE_ETYPES},
+    **{e: ('Компоненты', _rows_component) for e in COMPONENT_ETYPES},
+    **{e: ('Связи', _rows_link) for e in LINK_ETYPES},
+    **{e: ('Стенды и окружения', _rows_stand) for e in STAND_ETYPES}
+}
+DISPATCH = {k: ETYPE_SHEETS[etype] for etype, keys in ENTITY_MAP.items() for k in keys}
+REVERSE_HANDLER = ('Reverse', _rows_reverse)
+
+def collect_rows(files: List[Tuple[Path, Dict[str, Any]]], sheets) -> Dict[str, List[tuple]]:
+    out = {sn: [] for sn in sheets}
+    for p, data in files:
+        for k, d in data.items():
+            h = DISPATCH.get(k)
+            if h is None and isinstance(k, str) and k.startswith(_REVERSE_PREFIX): h = REVERSE_HANDLER
+            if h and h[0] in out: out[h[0]].extend(h[1](k, d))
+    return out
+
+def write_sheets(wb: Workbook, rows_by_sheet: Dict[str, List[tuple]]):
+    for sn, rows in rows_by_sheet.items():
+        if rows: write_sheet(wb, sn, rows)
+
+def save_regions_az_dc_offices(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Регионы', 'AZ', 'DC', 'Офисы')))
+def save_segments_nets_devices(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Сегменты', 'Сети', 'Сетевые устройства')))
+def save_kb_services(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Сервисы КБ',)))
+def save_tech_services(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Тех. сервисы',)))
+def save_components(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Компоненты',)))
+def save_links(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Связи',)))
+def save_stands(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Стенды и окружения',)))
+def save_reverse(files: List[Tuple[Path, Dict[str, Any]]], wb: Workbook): write_sheets(wb, collect_rows(files, ('Reverse',)))
 
 def main():
     try:
@@ -284,23 +281,27 @@ def main():
         parser = argparse.ArgumentParser(); parser.add_argument('--config', required=True); args = parser.parse_args()
         cpath = Path(args.config)
         if not cpath.exists(): print(f"ERROR: Config not found: {cpath}", file=sys.stderr); sys.exit(1)
-        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.safe_load(f) or {}
+        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.load(f, Loader=_Loader) or {}
         ydir, odir = cpath.parent / cfg.get('yaml_dir', '.'), cpath.parent / cfg.get('out_xlsx_dir', '.')
         odir.mkdir(parents=True, exist_ok=True)
-        src_counts = count_entities_in_yaml_dir(ydir)
+        files = load_all_yaml(ydir)
+        src_counts = count_entities_in_yaml_dir(files)
         for p in [odir / f for f in cfg.get('xlsx_files', [])]:
             try:
-                with pd.ExcelWriter(p, engine='openpyxl') as writer:
-                    name = p.name.lower()
-                    if 'reg' in name: save_regions_az_dc_offices(ydir, writer)
-                    if 'seg' in name: save_segments_nets_devices(ydir, writer)
-                    if 'kb' in name: save_kb_services(ydir, writer)
-                    if 'tech' in name or name == 'ta_services.xlsx' or name == 'services.xlsx': save_tech_services(ydir, writer)
-                    if 'comp' in name: save_components(ydir, writer)
-                    if 'link' in name: save_links(ydir, writer)
-                    if 'stand' in name: save_stands(ydir, writer)
-                    if 'reverse' in name: save_reverse(ydir, writer)
-                    if not writer.book.sheetnames: pd.DataFrame([{'Info': 'No data'}]).to_excel(writer, sheet_name='Empty')
+                wb = Workbook(write_only=True)
+                name = p.name.lower()
+                if 'reg' in name: save_regions_az_dc_offices(files, wb)
+                if 'seg' in name: save_segments_nets_devices(files, wb)
+                if 'kb' in name: save_kb_services(files, wb)
+                if 'tech' in name or name == 'ta_services.xlsx' or name == 'services.xlsx': save_tech_services(files, wb)
+                if 'comp' in name: save_components(files, wb)
+                if 'link' in name: save_links(files, wb)
+                if 'stand' in name: save_stands(files, wb)
+                if 'reverse' in name: save_reverse(files, wb)
+                if not wb.sheetnames:
+                    ws = wb.create_sheet(title='Empty')
+                    ws.append([None, 'Info']); ws.append([0, 'No data'])
+                wb.save(p)
                 print(f"Written data to {p.name}")
             except Exception as e: print(f"ERROR: Failed to write {p.name}: {e}", file=sys.stderr)
         dst_counts = count_entities_in_xlsx([odir / f for f in cfg.get('xlsx_files', [])])
@@ -6,16 +6,11 @@ from pathlib import Path
 
 def run_command(cmd, description):
     """Выполняет команду и выводит результат"""
-    print(f"\n--- {description} ---")
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+    print(f"\n--- {description} ---", flush=True)
+    result = subprocess.run(cmd)
     if result.returncode != 0:
         print(f"ERROR: {description} failed")
-        print("STDOUT:", result.stdout)
-        print("STDERR:", result.stderr)
         return False
-    print(result.stdout.strip())
-    if result.stderr.strip():
-        print("STDERR:", result.stderr.strip())
     return True
 
 def main():
@@ -1,8 +1,22 @@
+import os
+import re
 import sys
+import shutil
+import hashlib
+import zipfile
 from pathlib import Path
-import subprocess
+import importlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 import yaml
-import pandas as pd
+from collections import OrderedDict
+from openpyxl import load_workbook
+
+try: import python_calamine
+except ImportError: python_calamine = None
+
+try: from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError: from yaml import SafeLoader, SafeDumper
 
 # --- Test Configuration ---
 CWD = Path.cwd()
@@ -21,37 +35,67 @@ YAML_TO_XLSX_CONFIG_2 = CWD / 'config_seaf2_y2x_2.yaml'
 # --- Helper Functions ---
 
 def run_script(script_name: str, config_path: Path) -> bool:
-    """Runs a python script with a given config file."""
-    cmd = [sys.executable, script_name, '--config', str(config_path)]
-    print(f"--- Running: {' '.join(str(c) for c in cmd)} ---")
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-    if result.returncode != 0:
+    """Runs a conversion script's main() in-process with a given config file."""
+    argv = ['--config', str(config_path)]
+    print(f"--- Running: {script_name} {' '.join(argv)} ---", flush=True)
+    if str(CWD) not in sys.path:
+        sys.path.insert(0, str(CWD))
+    try:
+        # Imported once; later runs of the same script reuse the loaded module
+        importlib.import_module(Path(script_name).stem).main(argv)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"ERROR: Script {script_name} failed.")
+            return False
+    except Exception:
+        traceback.print_exc()
         print(f"ERROR: Script {script_name} failed.")
-        print("Stdout:", result.stdout)
-        print("Stderr:", result.stderr)
         return False
-    print(result.stdout.strip())
-    if result.stderr.strip():
-        print("Stderr:", result.stderr.strip())
+    finally:
+        sys.stdout.flush(); sys.stderr.flush()
     return True
 
+def scan_files(directory: Path, suffix: str) -> list:
+    """Directory entries with the given suffix, sorted by name; a missing directory yields none."""
+    try:
+        with os.scandir(directory) as it:
+            return sorted((e for e in it if e.name.endswith(suffix) and e.is_file()), key=lambda e: e.name)
+    except FileNotFoundError:
+        return []
+
+# Parsed YAML keyed by path, reused while mtime and size are unchanged
+_YAML_CACHE: OrderedDict = OrderedDict()
+_YAML_CACHE_MAX = 128
+
+def load_yaml_cached(entry: os.DirEntry):
+    st = entry.stat()
+    key = entry.path
+    hit = _YAML_CACHE.get(key)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        _YAML_CACHE.move_to_end(key)
+        return hit[2]
+    with open(key, 'rb') as f:
+        data = yaml.load(f, Loader=SafeLoader)
+    _YAML_CACHE[key] = (st.st_mtime_ns, st.st_size, data)
+    if len(_YAML_CACHE) > _YAML_CACHE_MAX:
+        _YAML_CACHE.popitem(last=False)
+    return data
+
 def compare_yaml_files(initial_dir: Path, final_dir: Path) -> dict:
     """Comparisons all YAML files between two directories."""
     diffs = {}
-    initial_files = sorted(list(initial_dir.glob('*.yaml')))
-    final_files = sorted(list(final_dir.glob('*.yaml')))
+    initial_files = scan_files(initial_dir, '.yaml')
+    final_files = scan_files(final_dir, '.yaml')
 
     # Create dictionaries for easier comparison
     initial_data = {}
     final_data = {}
     
     for file_path in initial_files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            initial_data[file_path.name] = yaml.safe_load(f)
+        initial_data[file_path.name] = load_yaml_cached(file_path)
     
     for file_path in final_files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            final_data[file_path.name] = yaml.safe_load(f)
+        final_data[file_path.name] = load_yaml_cached(file_path)
 
     # Compare file lists
     initial_names = set(initial_data.keys())
@@ -73,44 +117,98 @@ def compare_yaml_files(initial_dir: Path, final_dir: Path) -> dict:
             
     return diffs
 
+# Numeric and true/false text compare equal to the number or bool, as pandas' parser
+# inferred before; all numbers become float so equal values share one repr
+_NUMERIC_RE = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+_BOOL_TEXT = {'true': True, 'false': False}
+
+def _cell(v):
+    if v is None:
+        return ''
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, str):
+        return float(v) if _NUMERIC_RE.fullmatch(v) else _BOOL_TEXT.get(v.lower(), v)
+    if isinstance(v, (int, float)):
+        return float(v)
+    return v
+
+def row_digest(rows) -> tuple:
+    """Order-independent digest of the non-empty rows: (row count, sum of per-row hashes).
+
+    None reads as '' and trailing blanks are trimmed; equal multisets of rows give equal digests."""
+    count = total = 0
+    for row in rows:
+        row = tuple(map(_cell, row))
+        n = len(row)
+        while n and row[n - 1] == '':
+            n -= 1
+        if n:
+            count += 1
+            total += int.from_bytes(hashlib.blake2b(repr(row[:n]).encode('utf-8'), digest_size=8).digest(), 'little')
+    return count, total
+
+def sheet_digests(path: str) -> dict:
+    """Row digest per sheet in workbook order ('-----' maps to None); uses python-calamine when installed."""
+    if python_calamine:
+        wb = python_calamine.CalamineWorkbook.from_path(path)
+        return {name: None if name == '-----' else row_digest(wb.get_sheet_by_name(name).to_python()) for name in wb.sheet_names}
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return {name: None if name == '-----' else row_digest(wb[name].iter_rows(values_only=True)) for name in wb.sheetnames}
+    finally:
+        wb.close()
+
+def xlsx_content_digest(path: str) -> bytes:
+    """Hashes the workbook, shared strings and worksheet parts, ignoring volatile metadata."""
+    h = hashlib.blake2b(digest_size=16)
+    with zipfile.ZipFile(path) as z:
+        for name in sorted(z.namelist()):
+            if name in ('xl/workbook.xml', 'xl/sharedStrings.xml') or name.startswith('xl/worksheets/'):
+                h.update(name.encode('utf-8'))
+                h.update(z.read(name))
+    return h.digest()
+
+def compare_xlsx_pair(initial_path, final_path) -> dict:
+    """Compares one workbook pair sheet by sheet; returns the differences found (empty if none)."""
+    diffs = {}
+    if initial_path.name != final_path.name:
+        return {f"{initial_path.name} vs {final_path.name}": "Filename mismatch"}
+
+    try:
+        if xlsx_content_digest(initial_path.path) == xlsx_content_digest(final_path.path):
+            return diffs
+    except zipfile.BadZipFile:
+        pass
+
+    try:
+        initial_sheets = sheet_digests(initial_path.path)
+        final_sheets = sheet_digests(final_path.path)
+
+        if list(initial_sheets) != list(final_sheets):
+            return {initial_path.name: f"Sheet names differ. Initial: {list(initial_sheets)}, Final: {list(final_sheets)}"}
+
+        for sheet_name, rows in initial_sheets.items():
+            if rows != final_sheets[sheet_name]:
+                diffs.setdefault(initial_path.name, {})[sheet_name] = "Sheet content differs"
+
+    except Exception as e:
+        diffs[initial_path.name] = f"Error comparing file: {e}"
+    return diffs
+
 def compare_xlsx_files(initial_dir: Path, final_dir: Path) -> dict:
     """Comparisons all XLSX files between two directories sheet by sheet."""
     diffs = {}
-    initial_files = sorted(list(initial_dir.glob('*.xlsx')))
-    final_files = sorted(list(final_dir.glob('*.xlsx')))
+    initial_files = scan_files(initial_dir, '.xlsx')
+    final_files = scan_files(final_dir, '.xlsx')
 
     if len(initial_files) != len(final_files):
         return {"file_count_mismatch": f"Initial: {len(initial_files)}, Final: {len(final_files)}"}
 
-    for initial_path, final_path in zip(initial_files, final_files):
-        if initial_path.name != final_path.name:
-            diffs[f"{initial_path.name} vs {final_path.name}"] = "Filename mismatch"
-            continue
-
-        try:
-            initial_xls = pd.ExcelFile(initial_path)
-            final_xls = pd.ExcelFile(final_path)
-
-            if initial_xls.sheet_names != final_xls.sheet_names:
-                diffs[initial_path.name] = f"Sheet names differ. Initial: {initial_xls.sheet_names}, Final: {final_xls.sheet_names}"
-                continue
-
-            for sheet_name in initial_xls.sheet_names:
-                if sheet_name == '-----':
-                    continue
-                df_initial = initial_xls.parse(sheet_name).fillna('')
-                df_final = final_xls.parse(sheet_name).fillna('')
-                
-                first_col = df_initial.columns[0]
-                df_initial = df_initial.sort_values(by=first_col).reset_index(drop=True)
-                df_final = df_final.sort_values(by=first_col).reset_index(drop=True)
-
-                if not df_initial.equals(df_final):
-                    diffs.setdefault(initial_path.name, {})[sheet_name] = "Sheet content differs"
-
-        except Exception as e:
-            diffs[initial_path.name] = f"Error comparing file: {e}"
-            
+    # Pairs are independent; readers spend most of their time in zlib/XML C code
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(initial_files)))) as ex:
+        for pair_diffs in ex.map(compare_xlsx_pair, initial_files, final_files):
+            diffs.update(pair_diffs)
     return diffs
 
 def main():
@@ -118,18 +216,18 @@ def main():
     # --- Preparation ---
     print("--- Preparing test environment for SEAF2 ---")
     for d in [XLSX_INITIAL_DIR, YAML_ROUNDTRIP_DIR, XLSX_FINAL_DIR]:
-        d.mkdir(exist_ok=True)
-        for f in d.glob('*'): f.unlink()
+        if d.exists(): shutil.rmtree(d)
+        d.mkdir(parents=True, exist_ok=True)
 
     # --- Create Configs ---
-    with open(YAML_TO_XLSX_CONFIG_1, 'w', encoding='utf-8') as f:
-        yaml.dump({'yaml_dir': str(YAML_SOURCE_DIR), 'out_xlsx_dir': str(XLSX_INITIAL_DIR), 'xlsx_files': ['regions_az_dc_offices.xlsx', 'segments_nets_netdevices.xlsx', 'kb_services.xlsx']}, f)
-    
-    with open(XLSX_TO_YAML_CONFIG, 'w', encoding='utf-8') as f:
-        yaml.dump({'xlsx_files': [str(XLSX_INITIAL_DIR / 'regions_az_dc_offices.xlsx'), str(XLSX_INITIAL_DIR / 'segments_nets_netdevices.xlsx'), str(XLSX_INITIAL_DIR / 'kb_services.xlsx')], 'out_yaml_dir': str(YAML_ROUNDTRIP_DIR)}, f)
-
-    with open(YAML_TO_XLSX_CONFIG_2, 'w', encoding='utf-8') as f:
-        yaml.dump({'yaml_dir': str(YAML_ROUNDTRIP_DIR), 'out_xlsx_dir': str(XLSX_FINAL_DIR), 'xlsx_files': ['regions_az_dc_offices.xlsx', 'segments_nets_netdevices.xlsx', 'kb_services.xlsx']}, f)
+    xlsx_names = ['regions_az_dc_offices.xlsx', 'segments_nets_netdevices.xlsx', 'kb_services.xlsx']
+    configs = [
+        (YAML_TO_XLSX_CONFIG_1, {'yaml_dir': str(YAML_SOURCE_DIR), 'out_xlsx_dir': str(XLSX_INITIAL_DIR), 'xlsx_files': xlsx_names}),
+        (XLSX_TO_YAML_CONFIG, {'xlsx_files': [str(XLSX_INITIAL_DIR / n) for n in xlsx_names], 'out_yaml_dir': str(YAML_ROUNDTRIP_DIR)}),
+        (YAML_TO_XLSX_CONFIG_2, {'yaml_dir': str(YAML_ROUNDTRIP_DIR), 'out_xlsx_dir': str(XLSX_FINAL_DIR), 'xlsx_files': xlsx_names}),
+    ]
+    for path, cfg in configs:
+        path.write_text(yaml.dump(cfg, Dumper=SafeDumper, sort_keys=False), encoding='utf-8')
 
     # --- STEP 1: YAML -> XLSX (Initial) ---
     print("\n[Step 1/4] Converting SEAF2 YAML to INITIAL XLSX...")
@@ -148,10 +246,11 @@ def main():
 
     # --- STEP 4: Verification ---
     print("\n[Step 4/4] Verifying conversion results by comparing XLSX files...")
-    xlsx_differences = compare_xlsx_files(XLSX_INITIAL_DIR, XLSX_FINAL_DIR)
-    
     print("\n[Additional Check] Comparing YAML files...")
-    yaml_differences = compare_yaml_files(YAML_SOURCE_DIR, YAML_ROUNDTRIP_DIR)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fx = ex.submit(compare_xlsx_files, XLSX_INITIAL_DIR, XLSX_FINAL_DIR)
+        fy = ex.submit(compare_yaml_files, YAML_SOURCE_DIR, YAML_ROUNDTRIP_DIR)
+        xlsx_differences, yaml_differences = fx.result(), fy.result()
 
     # --- Final Report ---
     print("\n--- SEAF2 TEST RESULT ---")
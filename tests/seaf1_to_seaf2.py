@@ -1,85 +1,113 @@
 #!/usr/bin/env python3
+import os
 import sys
 import argparse
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
 import yaml
 
-def convert_seaf1_to_seaf2(input_dir: Path, output_dir: Path):
-    """Конвертирует файлы из формата SEAF1 в SEAF2"""
-    print(f"Converting SEAF1 to SEAF2...")
-    print(f"Input directory: {input_dir}")
-    print(f"Output directory: {output_dir}")
+try: from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError: from yaml import SafeLoader, SafeDumper
+from concurrent.futures import ProcessPoolExecutor
+
+PARALLEL_MIN_FILES = 20
+
+# Mapping of namespace changes
+_S1_TO_S2_NS = MappingProxyType({
+    'seaf.ta.services.dc_region': 'seaf.company.ta.services.dc_regions',
+    'seaf.ta.services.dc_az': 'seaf.company.ta.services.dc_azs',
+    'seaf.ta.services.dc': 'seaf.company.ta.services.dcs',
+    'seaf.ta.services.office': 'seaf.company.ta.services.dc_offices',
+    'seaf.ta.services.network_segment': 'seaf.company.ta.services.network_segments',
+    'seaf.ta.services.network': 'seaf.company.ta.services.networks',
+    'seaf.ta.services.kb': 'seaf.company.ta.services.kbs',
+    'seaf.ta.components.network': 'seaf.company.ta.components.networks'
+})
+
+# File name mappings
+_S1_TO_S2_FILES = MappingProxyType({
+    'components_network.yaml': 'network_component.yaml',
+    'office.yaml': 'dc_office.yaml',
+    'root.yaml': '_root.yaml'
+})
+
+# Reverse mappings
+_S2_TO_S1_NS = MappingProxyType({
+    'seaf.company.ta.services.dc_regions': 'seaf.ta.services.dc_region',
+    'seaf.company.ta.services.dc_azs': 'seaf.ta.services.dc_az',
+    'seaf.company.ta.services.dcs': 'seaf.ta.services.dc',
+    'seaf.company.ta.services.dc_offices': 'seaf.ta.services.office',
+    'seaf.company.ta.services.network_segments': 'seaf.ta.services.network_segment',
+    'seaf.company.ta.services.networks': 'seaf.ta.services.network',
+    'seaf.company.ta.services.kbs': 'seaf.ta.services.kb',
+    'seaf.company.ta.components.networks': 'seaf.ta.components.network'
+})
+
+_S2_TO_S1_FILES = MappingProxyType({
+    'network_component.yaml': 'components_network.yaml',
+    'dc_office.yaml': 'office.yaml',
+    '_root.yaml': 'root.yaml'
+})
+
+# Workers look mappings up by direction (mapping proxies do not pickle)
+_MAPPINGS = {
+    'seaf1-to-seaf2': (_S1_TO_S2_NS, _S1_TO_S2_FILES),
+    'seaf2-to-seaf1': (_S2_TO_S1_NS, _S2_TO_S1_FILES)
+}
+
+def _convert_one(args):
+    """Конвертирует один файл; возвращает имя выходного файла или None, если файл пропущен"""
+    yaml_file, output_dir, direction = args
+    namespace_mappings, file_mappings = _MAPPINGS[direction]
+    raw = yaml_file.read_bytes()
+    data = yaml.load(raw, Loader=SafeLoader)
+        
+    if not isinstance(data, dict):
+        return None
     
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # Determine output filename
+    output_filename = file_mappings.get(yaml_file.name, yaml_file.name)
+    output_path = output_dir / output_filename
     
-    # Mapping of entity name changes
-    entity_mappings = {
-        'dc_region': 'dc_regions',
-        'dc_az': 'dc_azs',
-        'dc': 'dcs',
-        'office': 'dc_offices',
-        'network_segment': 'network_segments',
-        'network': 'networks',
-        'kb': 'kbs'
-    }
+    # No namespace to rename: keep the source bytes instead of re-serializing
+    if namespace_mappings.keys().isdisjoint(data):
+        output_path.write_bytes(raw)
+        return output_filename
     
-    # Mapping of namespace changes
-    namespace_mappings = {
-        'seaf.ta.services.dc_region': 'seaf.company.ta.services.dc_regions',
-        'seaf.ta.services.dc_az': 'seaf.company.ta.services.dc_azs',
-        'seaf.ta.services.dc': 'seaf.company.ta.services.dcs',
-        'seaf.ta.services.office': 'seaf.company.ta.services.dc_offices',
-        'seaf.ta.services.network_segment': 'seaf.company.ta.services.network_segments',
-        'seaf.ta.services.network': 'seaf.company.ta.services.networks',
-        'seaf.ta.services.kb': 'seaf.company.ta.services.kbs',
-        'seaf.ta.components.network': 'seaf.company.ta.components.networks'
-    }
+    # Update namespaces
+    new_data = {namespace_mappings.get(key, key): value for key, value in data.items()}
     
-    # File name mappings
-    file_mappings = {
-        'components_network.yaml': 'network_component.yaml',
-        'office.yaml': 'dc_office.yaml',
-        'root.yaml': '_root.yaml'
-    }
+    # Write converted file
+    output_path.write_bytes(yaml.dump(new_data, Dumper=SafeDumper, encoding='utf-8', default_flow_style=False, allow_unicode=True, sort_keys=False))
+    return output_filename
+
+def _convert_all(input_dir: Path, output_dir: Path, direction: str) -> int:
+    with os.scandir(input_dir) as it:
+        files = [Path(e.path) for e in it if e.name.endswith('.yaml') and not e.name.startswith('_')]  # Skip _root.yaml
+    jobs = [(p, output_dir, direction) for p in files]
+    if len(files) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor() as ex:
+            results = list(ex.map(_convert_one, jobs, chunksize=max(1, len(files) // (4 * (os.cpu_count() or 1)))))
+    else:
+        results = [_convert_one(j) for j in jobs]
     
     converted_files = 0
-    
-    for yaml_file in input_dir.glob('*.yaml'):
-        if yaml_file.name.startswith('_'):  # Skip _root.yaml
+    for yaml_file, output_filename in zip(files, results):
+        if output_filename is None:
             continue
-            
-        with yaml_file.open('r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            
-        if not isinstance(data, dict):
-            continue
-            
-        new_data = {}
-        
-        for key, value in data.items():
-            # Update namespace
-            new_key = namespace_mappings.get(key, key)
-            
-            if isinstance(value, dict):
-                # Update entity names within the data
-                new_value = {}
-                for entity_id, entity_data in value.items():
-                    new_value[entity_id] = entity_data
-                new_data[new_key] = new_value
-            else:
-                new_data[new_key] = value
-        
-        # Determine output filename
-        output_filename = file_mappings.get(yaml_file.name, yaml_file.name)
-        output_path = output_dir / output_filename
-        
-        # Write converted file
-        with output_path.open('w', encoding='utf-8') as f:
-            yaml.dump(new_data, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
-        
         print(f"  Converted: {yaml_file.name} → {output_filename}")
         converted_files += 1
+    return converted_files
+
+def convert_seaf1_to_seaf2(input_dir: Path, output_dir: Path):
+    """Конвертирует файлы из формата SEAF1 в SEAF2"""
+    print(f"Converting SEAF1 to SEAF2...")
+    print(f"Input directory: {input_dir}")
+    print(f"Output directory: {output_dir}")
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    converted_files = _convert_all(input_dir, output_dir, 'seaf1-to-seaf2')
     
     print(f"Conversion complete. {converted_files} files converted.")
 
@@ -91,53 +119,7 @@ def convert_seaf2_to_seaf1(input_dir: Path, output_dir: Path):
     
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Reverse mappings
-    namespace_mappings = {
-        'seaf.company.ta.services.dc_regions': 'seaf.ta.services.dc_region',
-        'seaf.company.ta.services.dc_azs': 'seaf.ta.services.dc_az',
-        'seaf.company.ta.services.dcs': 'seaf.ta.services.dc',
-        'seaf.company.ta.services.dc_offices': 'seaf.ta.services.office',
-        'seaf.company.ta.services.network_segments': 'seaf.ta.services.network_segment',
-        'seaf.company.ta.services.networks': 'seaf.ta.services.network',
-        'seaf.company.ta.services.kbs': 'seaf.ta.services.kb',
-        'seaf.company.ta.components.networks': 'seaf.ta.components.network'
-    }
-    
-    file_mappings = {
-        'network_component.yaml': 'components_network.yaml',
-        'dc_office.yaml': 'office.yaml',
-        '_root.yaml': 'root.yaml'
-    }
-    
-    converted_files = 0
-    
-    for yaml_file in input_dir.glob('*.yaml'):
-        if yaml_file.name.startswith('_'):  # Skip _root.yaml
-            continue
-            
-        with yaml_file.open('r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            
-        if not isinstance(data, dict):
-            continue
-            
-        new_data = {}
-        
-        for key, value in data.items():
-            # Update namespace
-            new_key = namespace_mappings.get(key, key)
-            new_data[new_key] = value
-        
-        # Determine output filename
-        output_filename = file_mappings.get(yaml_file.name, yaml_file.name)
-        output_path = output_dir / output_filename
-        
-        # Write converted file
-        with output_path.open('w', encoding='utf-8') as f:
-            yaml.dump(new_data, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
-        
-        print(f"  Converted: {yaml_file.name} → {output_filename}")
-        converted_files += 1
+    converted_files = _convert_all(input_dir, output_dir, 'seaf2-to-seaf1')
     
     print(f"Conversion complete. {converted_files} files converted.")
 
@@ -1,15 +1,26 @@
+import os
 import sys
 import re
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Set
+from typing import List, Dict, Any, Tuple, Set, Iterator
 from copy import deepcopy
 import math
+from concurrent.futures import ProcessPoolExecutor
 import yaml
 import pandas as pd
 
 DEBUG_LOG_FILE = Path('debug_script.log')
 
+_NULL_TOKENS = frozenset({"nan", "none", "null", "n/a", "na", ""})
+_WS_RE = re.compile(r'\s+')
+_NL_RE = re.compile(r'[\r\n]+')
+_ID_SPLIT_RE = re.compile(r'[;,]')
+_LOC_SPLIT_RE = re.compile(r'[;,\s]+')
+_TOKEN_RE = re.compile(r'[^A-Za-z0-9]+')
+_DC_RE = re.compile(r'\.dc(\d+)')
+_OFFICE_RE = re.compile(r'\.office\.([a-zA-Z0-9-]+)')
+
 # --- Schema Definitions ---
 # Mandatory: Script cannot function/identify objects without these.
 # Optional: Script runs, but attributes will be missing.
@@ -89,18 +100,33 @@ SVC_TYPE_MAP = {
     'Логгирование': 'Серверы приложений и т.д.'
 }
 
+# Columns that feed ws_clean/id_clean only; cleaned per column before the row loop (text, ids)
+CLEAN_COLUMNS = {
+    'Регионы': (('Описание', 'Наименование'), ('ID Региона',)),
+    'AZ': (('Описание', 'Наименование', 'Поставщик'), ('ID AZ', 'Регион')),
+    'DC': (('Адрес', 'Описание', 'Форма владения', 'Кол-во стоек', 'Tier', 'Наименование', 'Тип', 'Поставщик'), ('ID DC', 'AZ')),
+    'Офисы': (('Адрес', 'Описание', 'Наименование'), ('ID Офиса', 'Регион')),
+    'Сегменты': (('Наименование', 'Описание', 'Зона'), ('ID сетевые сегмента/зоны',)),
+    'Сети': (('Тип сети', 'Наименование', 'Описание', 'VLAN', 'Адрес сети', 'WAN Адрес', 'Провайдер'), ('ID Network',)),
+    'Сетевые устройства': (('Наименование', 'Тип реализации', 'Модель', 'Назначение', 'IP адрес', 'Описание'), ()),
+    'Компоненты': (('Класс', 'Наименование', 'Описание', 'Тип'), ('Идентификатор', 'Сегмент')),
+    'Сервисы КБ': (('Название сервиса', 'Название', 'Технология', 'Описание', 'Статус', 'Название ПО', 'Tag'), ('ID КБ сервиса',)),
+    'Тех. сервисы': (('Тип сервиса', 'Класс', 'Тип резервирования', 'Наименование', 'Описание'), ('Идентификатор',))
+}
+
 # --- Validation Logic ---
 
 def normalize_sheet_name(name: str) -> str:
     return SHEET_ALIASES.get(name, name)
 
-def validate_structure(xlsx_path: Path, force: bool) -> bool:
+# Returns the (preloaded or freshly opened) workbook to convert, or None to skip it
+def validate_structure(xlsx_path: Path, force: bool, xls: 'ExcelBook | None' = None) -> 'ExcelBook | None':
     print(f"\n[CHECK] Analyzing structure: {xlsx_path.name}")
     try:
-        xls = pd.ExcelFile(xlsx_path)
+        if xls is None: xls = ExcelBook(xlsx_path)
     except Exception as e:
         print(f"[FATAL] Cannot open file: {e}")
-        return False
+        return None
 
     issues_found = False
     critical_missing = False
@@ -111,7 +137,7 @@ def validate_structure(xlsx_path: Path, force: bool) -> bool:
     relevant_sheets = set(SCHEMA_DEF.keys())
     if not found_sheets.intersection(relevant_sheets):
         print(f"  [!!] No recognized SEAF sheets found. (Expected one of: {', '.join(relevant_sheets)})")
-        return False if not force else True
+        return None if not force else xls
 
     for sheet_original in xls.sheet_names:
         sheet_norm = normalize_sheet_name(sheet_original)
@@ -119,7 +145,7 @@ def validate_structure(xlsx_path: Path, force: bool) -> bool:
             continue
             
         print(f"  Sheet '{sheet_original}' (mapped to '{sheet_norm}'):")
-        df = xls.parse(sheet_original).dropna(how='all')
+        df = non_empty_rows(xls.parse(sheet_original))
         cols = set(df.columns)
         
         required = SCHEMA_DEF[sheet_norm]['mandatory']
@@ -143,14 +169,14 @@ def validate_structure(xlsx_path: Path, force: bool) -> bool:
 
     if critical_missing and not force:
         print("\n[STOP] Critical columns are missing. Unable to proceed reliably.")
-        return False
+        return None
         
     if issues_found and not force:
         choice = input("\n[?] Structural issues found. Continue anyway? [y/N]: ").strip().lower()
         if choice != 'y':
-            return False
+            return None
             
-    return True
+    return xls
 
 class DataValidator:
     def __init__(self):
@@ -206,9 +232,9 @@ def normalize_svc_type(val):
 def derive_location_from_network(net_id):
     if not net_id: return None
     prefix = net_id.split('.')[0] if '.' in net_id else 'seaf'
-    m_dc = re.search(r'\.dc(\d+)', net_id)
+    m_dc = _DC_RE.search(net_id)
     if m_dc: return f"{prefix}.dc.{m_dc.group(1)}"
-    m_off = re.search(r'\.office\.([a-zA-Z0-9-]+)', net_id)
+    m_off = _OFFICE_RE.search(net_id)
     if m_off:
         parts = net_id.split('.')
         try:
@@ -219,32 +245,81 @@ def derive_location_from_network(net_id):
         except ValueError: pass
     return None
 
-def ensure_deps():
-    try: import pandas, yaml, openpyxl
-    except ImportError:
-        import subprocess
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pandas', 'openpyxl', 'pyyaml'])
+class ExcelBook:
+    def __init__(self, path: Path, frames: Dict[str, pd.DataFrame] | None = None):
+        self.path = path
+        self.xls = None if frames is not None else pd.ExcelFile(path)
+        self.sheet_names = list(frames) if frames is not None else self.xls.sheet_names
+        self._frames: Dict[str, pd.DataFrame] = frames or {}
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self._frames: self._frames[sheet_name] = self.xls.parse(sheet_name)
+        return self._frames[sheet_name]
 
-def read_excel(path: Path):
+def read_excel(path: Path) -> ExcelBook:
     if not path.exists(): raise FileNotFoundError(f"Excel file not found: {path}")
-    try: return pd.ExcelFile(path)
+    try: return ExcelBook(path)
     except Exception as e: raise RuntimeError(f"Failed to open Excel {path.name}: {e}")
 
-def non_empty_rows(df): return df.dropna(how='all')
+def _load_sheets(path: Path) -> Dict[str, pd.DataFrame]:
+    return pd.read_excel(path, sheet_name=None)
+
+def load_workbooks(paths: List[Path]) -> Dict[Path, ExcelBook]:
+    # Only parsing runs in parallel: conversion stays sequential because the validator's
+    # cross-workbook reference checks and the shared output files depend on file order
+    if len(paths) < 2: return {}
+    try:
+        with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as ex:
+            futures = {p: ex.submit(_load_sheets, p) for p in paths}
+            books = {}
+            for p, fut in futures.items():
+                try: books[p] = ExcelBook(p, fut.result())
+                except Exception: pass
+            return books
+    except Exception as e:
+        print(f"WARN: Parallel workbook loading failed, falling back to sequential: {e}", file=sys.stderr)
+        return {}
+
+def non_empty_rows(df):
+    # Small sheets rarely contain blank rows; skip the dropna copy when there is nothing to drop
+    mask = df.notna().to_numpy().any(axis=1)
+    return df if mask.all() else df.iloc[mask]
+
+# Column values as an object array; a missing column reads as all None, like row.get
+def column(df, name: str):
+    return df[name].to_numpy(dtype=object) if name in df.columns else [None] * len(df)
+
+def iter_records(df) -> Iterator[Dict[str, Any]]:
+    # Plain dicts from itertuples: no per-row Series construction as with iterrows
+    cols = list(df.columns)
+    for values in df.itertuples(index=False, name=None): yield dict(zip(cols, values))
 
 def ws_clean(s: Any) -> Any:
     if s is None: return None
     if isinstance(s, float) and math.isnan(s): return None
     s = str(s)
     if not s: return None
-    s = s.replace('\u00A0', ' ').replace('\xa0', ' ').replace('\t', ' ').replace('\n', ' ').replace('\r', ' ')
-    s = re.sub(r'\s+', ' ', s).strip()
-    if s.lower() in {"nan", "none", "null", "n/a", "na", ""}: return None
+    s = _WS_RE.sub(' ', s).strip()  # \s also covers NBSP, tabs and line breaks
+    if s.lower() in _NULL_TOKENS: return None
     return s or None
 
 def id_clean(s: Any) -> str | None:
     s = ws_clean(s)
-    return re.sub(r'\s+', '', s) if s else None
+    return _WS_RE.sub('', s) if s else None
+
+# Column-wise ws_clean (id_clean with ident=True); empty cells become None
+def clean_col(col: pd.Series, ident: bool = False) -> pd.Series:
+    present = col.notna()
+    s = col.map(str, na_action='ignore').astype(object).where(present, '')
+    s = s.str.replace(_WS_RE, ' ', regex=True).str.strip()
+    null = s.str.lower().isin(_NULL_TOKENS)
+    if ident: s = s.str.replace(' ', '', regex=False)
+    return s.where(~null, None)
+
+def clean_frame(df: pd.DataFrame, text: Tuple[str, ...] = (), ids: Tuple[str, ...] = ()) -> pd.DataFrame:
+    cols = {c: clean_col(df[c]) for c in text if c in df.columns}
+    cols.update({c: clean_col(df[c], ident=True) for c in ids if c in df.columns})
+    return df.assign(**cols) if cols else df
 
 def parse_multiline_ids(val) -> List[str]:
     if val is None: return []
@@ -255,45 +330,67 @@ def parse_multiline_ids(val) -> List[str]:
         line = line.strip()
         if not line: continue
         if line.startswith('-'): line = line[1:].strip()
-        for piece in re.split(r'[;,]', line):
+        for piece in _ID_SPLIT_RE.split(line):
             if cleaned := id_clean(piece): tokens.append(cleaned)
     return tokens
 
 def parse_locations(val: Any) -> List[str]:
     if val is None: return []
     s = ws_clean(str(val))
-    return [t for p in re.split(r'[;,\s]+', s) if (t := id_clean(p))] if s else []
+    return [t for p in _LOC_SPLIT_RE.split(s) if (t := id_clean(p))] if s else []
+
+try: from yaml import CSafeLoader as _Loader
+except ImportError: from yaml import SafeLoader as _Loader
 
+# Stays on the pure-Python SafeDumper: libyaml's emitter ignores the increase_indent override
 class IndentedDumper(yaml.SafeDumper):
     def increase_indent(self, flow=False, indentless=False): return super(IndentedDumper, self).increase_indent(flow, False)
+    # Data is sanitized in place, so entries split per location still share lists; never emit anchors
+    def ignore_aliases(self, data): return True
+
+# Entities per written file, so the summary does not have to re-read the output directory
+WRITTEN_COUNTS: Dict[Path, Dict[str, int]] = {}
 
 def write_yaml(path: Path, data: Dict[str, Any]):
     try:
         path.parent.mkdir(parents=True, exist_ok=True)
+        data = sanitize_for_yaml(data)
         with path.open('w', encoding='utf-8') as f:
-            yaml.dump(sanitize_for_yaml(data), f, Dumper=IndentedDumper, allow_unicode=True, sort_keys=False)
-    except Exception as e: print(f"ERROR: Failed to write YAML to {path}: {e}", file=sys.stderr)
+            yaml.dump(data, f, Dumper=IndentedDumper, allow_unicode=True, sort_keys=False)
+        WRITTEN_COUNTS[path] = {key.replace('seaf.ta.services.', '').replace('seaf.ta.components.', 'components.'): len(val) for key, val in data.items() if isinstance(val, dict)}
+    except Exception as e:
+        WRITTEN_COUNTS.pop(path, None)
+        print(f"ERROR: Failed to write YAML to {path}: {e}", file=sys.stderr)
 
+# Drops '_'-prefixed keys and flattens newlines in place rather than copying the tree
 def sanitize_for_yaml(value: Any) -> Any:
-    if isinstance(value, dict): return {k: sanitize_for_yaml(v) for k, v in value.items() if not k.startswith('_')}
-    if isinstance(value, list): return [sanitize_for_yaml(v) for v in value]
-    if isinstance(value, str): return re.sub(r'[\r\n]+', ' ', value)
+    if isinstance(value, str): return _NL_RE.sub(' ', value)
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for k in [k for k in node if k.startswith('_')]: del node[k]
+            items = node.items()
+        elif isinstance(node, list): items = enumerate(node)
+        else: continue
+        for k, v in items:
+            if isinstance(v, str):
+                if '\n' in v or '\r' in v: node[k] = _NL_RE.sub(' ', v)
+            elif isinstance(v, (dict, list)): stack.append(v)
     return value
 
-def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
+def count_entities_in_xlsx(books: List[ExcelBook]) -> Dict[str, int]:
     counts = {}
     sheet_map = {'Регионы': 'dc_region', 'AZ': 'dc_az', 'DC': 'dc', 'Офисы': 'office', 'Сегменты': 'network_segment', 'Сети': 'network', 'Сетевые устройства': 'components.network', 'Сервисы КБ': 'kb', 'Тех. сервисы': 'tech_services', 'Tech Services': 'tech_services'}
-    for file_path in xlsx_files:
-        if not file_path.exists(): continue
+    for xls in books:
         try:
-            xls = pd.ExcelFile(file_path)
             for sheet_name in xls.sheet_names:
                 if sheet_name in sheet_map:
                     df = non_empty_rows(xls.parse(sheet_name))
                     ename = sheet_map[sheet_name]
                     if ename == 'tech_services':
                         typed_ids = {}
-                        for _, row in df.iterrows():
+                        for row in iter_records(df):
                             oid = id_clean(row.get('Идентификатор'))
                             if not oid: continue
                             svc_raw, res_val, cls_val = ws_clean(row.get('Тип сервиса')) or ws_clean(row.get('Класс')), ws_clean(row.get('Тип резервирования')), ws_clean(row.get('Класс'))
@@ -312,55 +409,46 @@ def count_entities_in_xlsx(xlsx_files: List[Path]) -> Dict[str, int]:
         except Exception: pass
     return counts
 
-def count_entities_in_yaml_dir(yaml_dir: Path) -> Dict[str, int]:
+def count_written_entities() -> Dict[str, int]:
     counts = {}
-    if not yaml_dir.exists(): return counts
-    for p in sorted(yaml_dir.glob('**/*.yaml')):
-        try:
-            with p.open('r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-                if not isinstance(data, dict): continue
-                for key, val in data.items():
-                    if isinstance(val, dict):
-                        ename = key.replace('seaf.ta.services.', '').replace('seaf.ta.components.', 'components.').replace('seaf.company.ta.services.', '').replace('seaf.company.ta.components.', 'components.')
-                        counts[ename] = counts.get(ename, 0) + len(val)
-        except Exception: continue
+    for file_counts in WRITTEN_COUNTS.values():
+        for ename, n in file_counts.items(): counts[ename] = counts.get(ename, 0) + n
     return counts
 
 def convert_regions_az_dc_offices(xls, out_dir: Path):
     reg, azs, dcs, off = {}, {}, {}, {}
     if 'Регионы' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Регионы')).iterrows():
-            rid = id_clean(row.get('ID Региона'))
+        for row in iter_records(clean_frame(non_empty_rows(xls.parse('Регионы')), *CLEAN_COLUMNS['Регионы'])):
+            rid = row.get('ID Региона')
             if rid: 
-                reg[rid] = {'description': ws_clean(row.get('Описание')), 'external_id': rid.split('.')[-1], 'title': ws_clean(row.get('Наименование'))}
+                reg[rid] = {'description': row.get('Описание'), 'external_id': rid.split('.')[-1], 'title': row.get('Наименование')}
                 VALIDATOR.register_id(rid, "Регионы")
                 VALIDATOR.register_location(rid)
     if reg: write_yaml(out_dir / 'dc_region.yaml', {'seaf.ta.services.dc_region': reg})
     
     if 'AZ' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('AZ')).iterrows():
-            aid = id_clean(row.get('ID AZ'))
+        for row in iter_records(clean_frame(non_empty_rows(xls.parse('AZ')), *CLEAN_COLUMNS['AZ'])):
+            aid = row.get('ID AZ')
             if aid: 
-                azs[aid] = {'description': ws_clean(row.get('Описание')), 'external_id': aid.split('.')[-1], 'region': id_clean(row.get('Регион')), 'title': ws_clean(row.get('Наименование')), 'vendor': ws_clean(row.get('Поставщик'))}
+                azs[aid] = {'description': row.get('Описание'), 'external_id': aid.split('.')[-1], 'region': row.get('Регион'), 'title': row.get('Наименование'), 'vendor': row.get('Поставщик')}
                 VALIDATOR.register_id(aid, "AZ")
                 VALIDATOR.register_location(aid)
     if azs: write_yaml(out_dir / 'dc_az.yaml', {'seaf.ta.services.dc_az': azs})
     
     if 'DC' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('DC')).iterrows():
-            did = id_clean(row.get('ID DC'))
+        for row in iter_records(clean_frame(non_empty_rows(xls.parse('DC')), *CLEAN_COLUMNS['DC'])):
+            did = row.get('ID DC')
             if did: 
-                dcs[did] = {'address': ws_clean(row.get('Адрес')), 'availabilityzone': id_clean(row.get('AZ')), 'description': ws_clean(row.get('Описание')), 'external_id': did.split('.')[-1], 'ownership': ws_clean(row.get('Форма владения')), 'rack_qty': ws_clean(row.get('Кол-во стоек')), 'tier': ws_clean(row.get('Tier')), 'title': ws_clean(row.get('Наименование')), 'type': ws_clean(row.get('Тип')), 'vendor': ws_clean(row.get('Поставщик'))}
+                dcs[did] = {'address': row.get('Адрес'), 'availabilityzone': row.get('AZ'), 'description': row.get('Описание'), 'external_id': did.split('.')[-1], 'ownership': row.get('Форма владения'), 'rack_qty': row.get('Кол-во стоек'), 'tier': row.get('Tier'), 'title': row.get('Наименование'), 'type': row.get('Тип'), 'vendor': row.get('Поставщик')}
                 VALIDATOR.register_id(did, "DC")
                 VALIDATOR.register_location(did)
     if dcs: write_yaml(out_dir / 'dc.yaml', {'seaf.ta.services.dc': dcs})
     
     if 'Офисы' in xls.sheet_names:
-        for idx, row in non_empty_rows(xls.parse('Офисы')).iterrows():
-            oid = id_clean(row.get('ID Офиса'))
+        for row in iter_records(clean_frame(non_empty_rows(xls.parse('Офисы')), *CLEAN_COLUMNS['Офисы'])):
+            oid = row.get('ID Офиса')
             if oid: 
-                off[oid] = {'address': ws_clean(row.get('Адрес')), 'description': ws_clean(row.get('Описание')), 'external_id': oid.split('.')[-1], 'region': id_clean(row.get('Регион')), 'title': ws_clean(row.get('Наименование'))}
+                off[oid] = {'address': row.get('Адрес'), 'description': row.get('Описание'), 'external_id': oid.split('.')[-1], 'region': row.get('Регион'), 'title': row.get('Наименование')}
                 VALIDATOR.register_id(oid, "Офисы")
                 VALIDATOR.register_location(oid)
     if off: write_yaml(out_dir / 'office.yaml', {'seaf.ta.services.office': off})
@@ -370,43 +458,45 @@ def convert_segments_nets_devices(xls, out_dir: Path):
     res = False
     if 'Сегменты' in xls.sheet_names:
         segments = {}
-        for _, r in non_empty_rows(xls.parse('Сегменты')).iterrows():
-            sid = id_clean(r.get('ID сетевые сегмента/зоны'))
+        for r in iter_records(clean_frame(non_empty_rows(xls.parse('Сегменты')), *CLEAN_COLUMNS['Сегменты'])):
+            sid = r.get('ID сетевые сегмента/зоны')
             if sid:
-                segments[sid] = {'title': ws_clean(r.get('Наименование')), 'description': ws_clean(r.get('Описание')), 'sber': {'location': parse_locations(r.get('Расположение'))[0] if parse_locations(r.get('Расположение')) else None, 'zone': ws_clean(r.get('Зона'))}}
+                segments[sid] = {'title': r.get('Наименование'), 'description': r.get('Описание'), 'sber': {'location': parse_locations(r.get('Расположение'))[0] if parse_locations(r.get('Расположение')) else None, 'zone': r.get('Зона')}}
                 VALIDATOR.register_id(sid, "Сегменты")
         if segments: write_yaml(out_dir / 'network_segment.yaml', {'seaf.ta.services.network_segment': segments}); res = True
     
     if 'Сети' in xls.sheet_names:
         nets = {}
-        for _, r in non_empty_rows(xls.parse('Сети')).iterrows():
-            nid = id_clean(r.get('ID Network'))
+        df = clean_frame(non_empty_rows(xls.parse('Сети')), *CLEAN_COLUMNS['Сети'])
+        cols = [column(df, c) for c in ('ID Network', 'Тип сети', 'Наименование', 'Описание', 'Расположение', 'Сетевой сегмент/зона(ID)', 'Сетевой сегмент/зона', 'VLAN', 'Адрес сети', 'Тип сети (проводная, беспроводная)', 'Тип LAN', 'WAN Адрес', 'Провайдер', 'VRF  ', 'VRF')]
+        for nid, ntype, title, desc, loc, seg_id, seg, vlan, ipnet, lan_type, lan_type_alt, wan_ip, prov, vrf, vrf_alt in zip(*cols):
             if not nid: continue
             VALIDATOR.register_id(nid, "Сети")
             VALIDATOR.register_network(nid)
             
-            ntype = ws_clean(r.get('Тип сети'))
-            entry = {'title': ws_clean(r.get('Наименование')), 'description': ws_clean(r.get('Описание')), 'type': ntype, 'location': parse_locations(r.get('Расположение')), 'segment': parse_multiline_ids(r.get('Сетевой сегмент/зона(ID)') or r.get('Сетевой сегмент/зона'))}
+            entry = {'title': title, 'description': desc, 'type': ntype, 'location': parse_locations(loc), 'segment': parse_multiline_ids(seg_id or seg)}
             if ntype == 'LAN':
-                if vlan := ws_clean(r.get('VLAN')): entry['vlan'] = int(float(vlan))
-                entry['ipnetwork'] = ws_clean(r.get('Адрес сети'))
-                entry['lan_type'] = ws_clean(r.get('Тип сети (проводная, беспроводная)') or r.get('Тип LAN'))
-            elif ntype == 'WAN': entry['wan_ip'] = ws_clean(r.get('WAN Адрес'))
-            if prov := ws_clean(r.get('Провайдер')): entry['provider'] = prov
-            if vrf := ws_clean(r.get('VRF  ') or ws_clean(r.get('VRF'))): entry['VRF'] = vrf
+                if vlan: entry['vlan'] = int(float(vlan))
+                entry['ipnetwork'] = ipnet
+                entry['lan_type'] = ws_clean(lan_type or lan_type_alt)
+            elif ntype == 'WAN': entry['wan_ip'] = wan_ip
+            if prov: entry['provider'] = prov
+            if vrf := ws_clean(vrf or ws_clean(vrf_alt)): entry['VRF'] = vrf
             nets[nid] = entry
         if nets:
             res = True
             prefix = next(iter(nets.keys())).split('.')[0] if '.' in next(iter(nets.keys())) else ''
-            per_loc, misc = {}, {}
+            per_loc, misc, tokens = {}, {}, {}
+            if prefix: dc_re, office_re = re.compile(rf'{re.escape(prefix)}\.dc\.(\d+)'), re.compile(rf'{re.escape(prefix)}\.office\.(.+)')
             for nid, entry in nets.items():
                 locs = entry.get('location')
                 if not locs: misc[nid] = entry; continue
                 for loc in locs:
-                    token = re.sub(r'[^A-Za-z0-9]+', '_', str(loc)).strip('_') or 'loc'
-                    if prefix:
-                        if m := re.search(rf'{re.escape(prefix)}\.dc\.(\d+)', loc): token = f'dc{m.group(1)}'
-                        elif m := re.search(rf'{re.escape(prefix)}\.office\.(.+)', loc): token = f'office_{m.group(1)}'
+                    if (token := tokens.get(loc)) is None:
+                        if prefix and (m := dc_re.search(loc)): token = f'dc{m.group(1)}'
+                        elif prefix and (m := office_re.search(loc)): token = f'office_{m.group(1)}'
+                        else: token = _TOKEN_RE.sub('_', loc).strip('_') or 'loc'
+                        tokens[loc] = token
                     per_loc.setdefault(token, {})[nid] = entry
             for t, s in per_loc.items(): write_yaml(out_dir / f'networks_{t}.yaml', {'seaf.ta.services.network': s})
             if misc: write_yaml(out_dir / 'networks_misc.yaml', {'seaf.ta.services.network': misc})
@@ -414,19 +504,20 @@ def convert_segments_nets_devices(xls, out_dir: Path):
     sheet = next((s for s in xls.sheet_names if s in ['Сетевые устройства', '??????? ??????????']), None)
     devs = {}
     if sheet:
-        for idx, row in non_empty_rows(xls.parse(sheet)).iterrows():
-            did = id_clean(row.get('ID Устройства') or row.get('ID ??????????'))
+        df = clean_frame(non_empty_rows(xls.parse(sheet)), *CLEAN_COLUMNS['Сетевые устройства'])
+        cols = [column(df, c) for c in ('ID Устройства', 'ID ??????????', 'Расположение', 'Подключенные сети (список)', 'Подключенные сети', 'Наименование', 'Тип реализации', 'Тип устройства', 'Тип', 'Расположение (ID сегмента/зоны)', 'Сетевой сегмент/зона (ID)', 'Модель', 'Назначение', 'IP адрес', 'Описание')]
+        for dev_id, dev_id_alt, loc, nets_list, nets_alt, title, realization, dtype, dtype_alt, seg, seg_alt, model, purpose, address, desc in zip(*cols):
+            did = id_clean(dev_id or dev_id_alt)
             if not did: continue
             VALIDATOR.register_id(did, "Сетевые устройства")
             
-            locs = parse_locations(row.get('Расположение'))
-            conn_nets = parse_multiline_ids(row.get('Подключенные сети (список)') or row.get('Подключенные сети'))
+            locs = parse_locations(loc)
+            conn_nets = parse_multiline_ids(nets_list or nets_alt)
             VALIDATOR.check_ref_network(conn_nets, did)
             
-            obj = {'title': ws_clean(row.get('Наименование')) or did, 'realization_type': ws_clean(row.get('Тип реализации')), 'type': ws_clean(row.get('Тип устройства') or row.get('Тип')), 'network_connection': conn_nets, 'segment': id_clean(row.get('Расположение (ID сегмента/зоны)') or row.get('Сетевой сегмент/зона (ID)'))}
-            for k, cs in [('model', ['Модель']), ('purpose', ['Назначение']), ('address', ['IP адрес']), ('description', ['Описание'])]:
-                for c in cs:
-                    if val := ws_clean(row.get(c)): obj[k] = val; break
+            obj = {'title': title or did, 'realization_type': realization, 'type': ws_clean(dtype or dtype_alt), 'network_connection': conn_nets, 'segment': id_clean(seg or seg_alt)}
+            for k, val in (('model', model), ('purpose', purpose), ('address', address), ('description', desc)):
+                if val: obj[k] = val
             if len(locs) > 1:
                 for l in locs: devs[f"{did}-{l.split('.')[-1]}"] = {**obj, 'location': l}
             else: obj['location'] = locs[0] if locs else None; devs[did] = obj
@@ -440,11 +531,11 @@ def convert_segments_nets_devices(xls, out_dir: Path):
         }
         collected = {k: {} for k in comp_config}
 
-        for idx, row in non_empty_rows(xls.parse(sheet_comp)).iterrows():
-            cls = ws_clean(row.get('Класс'))
+        for row in iter_records(clean_frame(non_empty_rows(xls.parse(sheet_comp)), *CLEAN_COLUMNS['Компоненты'])):
+            cls = row.get('Класс')
             if cls not in comp_config: continue
             
-            did = id_clean(row.get('Идентификатор'))
+            did = row.get('Идентификатор')
             if not did: continue
             VALIDATOR.register_id(did, "Компоненты")
             
@@ -453,11 +544,11 @@ def convert_segments_nets_devices(xls, out_dir: Path):
             VALIDATOR.check_ref_network(conn_nets, did)
             
             obj = {
-                'title': ws_clean(row.get('Наименование')),
-                'description': ws_clean(row.get('Описание')),
-                'type': ws_clean(row.get('Тип')),
+                'title': row.get('Наименование'),
+                'description': row.get('Описание'),
+                'type': row.get('Тип'),
                 'network_connection': conn_nets,
-                'segment': id_clean(row.get('Сегмент'))
+                'segment': row.get('Сегмент')
             }
             if len(locs) > 1:
                 for l in locs: collected[cls][f"{did}-{l.split('.')[-1]}"] = {**obj, 'location': l}
@@ -481,16 +572,16 @@ def convert_segments_nets_devices(xls, out_dir: Path):
 def convert_kb_services(xls, out_dir: Path):
     if 'Сервисы КБ' not in xls.sheet_names: return False
     kb = {}
-    for _, r in non_empty_rows(xls.parse('Сервисы КБ')).iterrows():
-        sid = id_clean(r.get('ID КБ сервиса'))
+    for r in iter_records(clean_frame(non_empty_rows(xls.parse('Сервисы КБ')), *CLEAN_COLUMNS['Сервисы КБ'])):
+        sid = r.get('ID КБ сервиса')
         if not sid: continue
         VALIDATOR.register_id(sid, "Сервисы КБ")
         
         conn_nets = parse_multiline_ids(r.get('Подключенные сети'))
         VALIDATOR.check_ref_network(conn_nets, sid)
         
-        title = ws_clean(r.get('Название сервиса')) or ws_clean(r.get('Название')) or ws_clean(r.get('Технология')) or sid
-        kb[sid] = {'title': title, 'description': ws_clean(r.get('Описание')), 'status': ws_clean(r.get('Статус')), 'technology': ws_clean(r.get('Технология')), 'software_name': ws_clean(r.get('Название ПО')), 'tag': ws_clean(r.get('Tag')), 'network_connection': conn_nets}
+        title = r.get('Название сервиса') or r.get('Название') or r.get('Технология') or sid
+        kb[sid] = {'title': title, 'description': r.get('Описание'), 'status': r.get('Статус'), 'technology': r.get('Технология'), 'software_name': r.get('Название ПО'), 'tag': r.get('Tag'), 'network_connection': conn_nets}
     if kb: write_yaml(out_dir / 'kb.yaml', {'seaf.ta.services.kb': kb}); return True
     return False
 
@@ -500,8 +591,8 @@ def convert_tech_services(xls, out_dir: Path):
     out_data = {'compute_service': {}, 'cluster': {}, 'monitoring': {}, 'backup': {}, 'software': {}, 'storage': {}}
     
     # Track unique IDs to avoid duplication if the same ID appears multiple times in Excel (e.g. multi-location)
-    for _, row in non_empty_rows(xls.parse(sheet)).iterrows():
-        oid = id_clean(row.get('Идентификатор'))
+    for row in iter_records(clean_frame(non_empty_rows(xls.parse(sheet)), *CLEAN_COLUMNS['Тех. сервисы'])):
+        oid = row.get('Идентификатор')
         if not oid: continue
         
         # Note: We don't register ID here immediately because rows might be split by location/network.
@@ -510,7 +601,7 @@ def convert_tech_services(xls, out_dir: Path):
         # We accept multiple rows for same ID in Tech Services as "partial definitions" to be merged.
         # So we skip duplicate ID check within this loop or handle it gracefully.
         
-        svc_raw, res_val, cls_val = ws_clean(row.get('Тип сервиса')) or ws_clean(row.get('Класс')), ws_clean(row.get('Тип резервирования')), ws_clean(row.get('Класс'))
+        svc_raw, res_val, cls_val = row.get('Тип сервиса') or row.get('Класс'), row.get('Тип резервирования'), row.get('Класс')
         nets = parse_multiline_ids(row.get('Подключен к сети') or row.get('Подключен к  сети'))
         locs = parse_locations(row.get('ЦОД'))
         if not locs:
@@ -539,7 +630,7 @@ def convert_tech_services(xls, out_dir: Path):
         # Only register new IDs
         VALIDATOR.register_id(oid, "Тех. сервисы")
 
-        obj = {'title': ws_clean(row.get('Наименование')), 'description': ws_clean(row.get('Описание')), 'location': locs, 'network_connection': nets, 'availabilityzone': []}
+        obj = {'title': row.get('Наименование'), 'description': row.get('Описание'), 'location': locs, 'network_connection': nets, 'availabilityzone': []}
         if etype in ['compute_service', 'cluster']: obj['service_type'] = normalize_svc_type(svc_raw)
         if etype == 'cluster': obj['reservation_type'] = res_val
         elif etype == 'monitoring': obj.update({'role':['Monitoring'], 'ha': res_val is not None, 'monitored_services':[]})
@@ -565,7 +656,6 @@ def convert_tech_services(xls, out_dir: Path):
 
 def main():
     try:
-        ensure_deps()
         parser = argparse.ArgumentParser()
         parser.add_argument('--config', required=True)
         parser.add_argument('--force', '-y', action='store_true', help='Skip validation prompts and force processing')
@@ -573,7 +663,7 @@ def main():
         
         cpath = Path(args.config)
         if not cpath.exists(): sys.exit(1)
-        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.safe_load(f) or {}
+        with cpath.open('r', encoding='utf-8') as f: cfg = yaml.load(f, Loader=_Loader) or {}
         inputs, out_dir = [cpath.parent / p for p in (cfg.get('xlsx_files') or [])], cpath.parent / cfg.get('out_yaml_dir', 'out_yaml')
         
         if out_dir.exists():
@@ -582,36 +672,37 @@ def main():
         out_dir.mkdir(parents=True, exist_ok=True)
         
         # Pre-flight check
-        valid_files = []
+        preloaded = load_workbooks([p for p in inputs if p.exists()])
+        books = []
         for p in inputs:
             if not p.exists():
                 print(f"ERROR: {p.name} not found.", file=sys.stderr)
                 continue
-            if validate_structure(p, args.force):
-                valid_files.append(p)
+            if (xls := validate_structure(p, args.force, preloaded.get(p))) is not None:
+                books.append((p, xls))
         
-        if not valid_files:
+        if not books:
             print("ERROR: No valid files to process.", file=sys.stderr)
             sys.exit(1)
 
-        src_counts = count_entities_in_xlsx(valid_files)
+        src_counts = count_entities_in_xlsx([xls for _, xls in books])
         processed = False
         
-        # Process files
-        for p in valid_files:
+        # Process files (each workbook was opened once, by validate_structure)
+        for p, xls in books:
             try:
-                xls = pd.ExcelFile(p)
+                sheets = frozenset(xls.sheet_names)
                 # Order matters for reference checking: regions/nets first usually
-                if any(s in xls.sheet_names for s in ['Регионы','AZ','DC','Офисы']): 
+                if not sheets.isdisjoint(['Регионы','AZ','DC','Офисы']): 
                     if convert_regions_az_dc_offices(xls, out_dir): processed = True
                 
-                if any(s in xls.sheet_names for s in ['Сегменты','Сети','Сетевые устройства']): 
+                if not sheets.isdisjoint(['Сегменты','Сети','Сетевые устройства']): 
                     if convert_segments_nets_devices(xls, out_dir): processed = True
                 
-                if 'Сервисы КБ' in xls.sheet_names: 
+                if 'Сервисы КБ' in sheets: 
                     if convert_kb_services(xls, out_dir): processed = True
                 
-                if any(s in xls.sheet_names for s in ['Тех. сервисы','Tech Services']): 
+                if not sheets.isdisjoint(['Тех. сервисы','Tech Services']): 
                     if convert_tech_services(xls, out_dir): processed = True
             except Exception as e: print(f"ERROR: {p.name}: {e}", file=sys.stderr)
             
@@ -620,9 +711,9 @@ def main():
         # Post-processing reporting
         VALIDATOR.report()
         
-        imports = [p.name for p in sorted(out_dir.glob('*.yaml')) if p.name != 'root.yaml']
+        imports = sorted(p.name for p in WRITTEN_COUNTS if p.name != 'root.yaml')
         if imports: write_yaml(out_dir / 'root.yaml', {'imports': imports})
-        dst_counts = count_entities_in_yaml_dir(out_dir)
+        dst_counts = count_written_entities()
         print("\n--- Conversion Summary ---")
         for k in sorted(list(set(src_counts.keys()) | set(dst_counts.keys()))):
             s, d = src_counts.get(k, 0), dst_counts.get(k, 0)